@@ -9,24 +9,70 @@ License: MIT
 
 import time
 import logging
-import base64
-import uuid
+import hashlib
 import os
 import asyncio
 import json
+import tempfile
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import Response, JSONResponse, FileResponse
+from fastapi.responses import Response, JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import ValidationError
 
-from app.models import Document
-from app.renderer import render_document
+from app.models import Document, DOCUMENT_ADAPTER
+from app.renderer import render_document_with_status, warmup
 from app.auto_repair import AutoRepair, create_repair_summary
 
+# SIMD-accelerated base64 when available; the stdlib module is API-compatible
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# Rust-backed JSON serialization when available
+try:
+    import orjson
+    json_dumps = orjson.dumps
+except ImportError:
+    def json_dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized with orjson (stdlib json as fallback)."""
+    
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+class PathScopedGZipMiddleware:
+    """
+    Gzip responses only for the given path prefixes.
+    
+    PDFs and base64 payloads are already high-entropy, so compressing them
+    wastes CPU; small JSON metadata responses still shrink well.
+    """
+    
+    def __init__(self, app, paths: Tuple[str, ...], minimum_size: int = 500):
+        self.app = app
+        self.paths = paths
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.paths):
+            await self.gzip_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,34 +80,346 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create temp directory for PDFs
-TEMP_DIR = Path("/tmp/sketchnote-pdfs")
-TEMP_DIR.mkdir(exist_ok=True)
+# Create temp directory for PDFs (tmpfs-backed /dev/shm when available,
+# since the files are short-lived and never need durable storage)
+_DEFAULT_TEMP_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+TEMP_DIR = Path(os.environ.get("SKETCHNOTE_TMP", os.path.join(_DEFAULT_TEMP_ROOT, "sketchnote-pdfs")))
+TEMP_DIR.mkdir(parents=True, exist_ok=True)
 MAX_PDF_AGE = 3600  # 1 hour
 
+# Characters replaced when building temp filenames from document titles
+FILENAME_SAFE_TABLE = str.maketrans({c: "_" for c in ' /\\:<>|?*"\0#%'})
+
+# High-frequency paths skipped by the request logging middleware
+UNLOGGED_PATH_PREFIXES = ("/health", "/temp-pdfs")
+
+# Endpoints whose JSON responses are worth gzipping
+GZIP_PATH_PREFIXES = ("/render-url", "/health")
+
+# Chunk size for streamed PDF responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+
+def available_cpus() -> int:
+    """Count the CPUs this process may run on (container limits included)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Rendering is CPU-bound, so it runs in worker processes (one per usable core
+# by default); the pool is created on startup, not at import time
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", available_cpus()))
+render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Return the render worker pool, creating it on first use."""
+    global render_pool
+    if render_pool is None:
+        render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return render_pool
+
+
+def replace_broken_render_pool(broken: ProcessPoolExecutor):
+    """
+    Swap out a pool whose worker died (e.g. OOM-killed).
+    
+    A ProcessPoolExecutor stays broken once a worker exits unexpectedly, so
+    it is replaced instead of failing every later render. Concurrent
+    requests that saw the same broken pool only replace it once.
+    """
+    global render_pool
+    if render_pool is broken:
+        logger.warning("Render worker pool is broken; starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+
+# Rendered PDF cache bounds
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get("RENDER_CACHE_MAX_ENTRIES", 256))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered PDFs keyed by document content.
+    
+    Keys are hashes of the validated document, so payloads that differ only
+    in key order, whitespace or repaired mistakes share one entry.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[bytes, bytes]" = OrderedDict()
+    
+    @staticmethod
+    def key_for(document: Document) -> bytes:
+        """Hash the canonical JSON form of a validated document."""
+        canonical = document.model_dump_json().encode('utf-8')
+        return hashlib.blake2b(canonical, digest_size=16).digest()
+    
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Return a cached PDF and mark it as recently used."""
+        pdf_bytes = self._entries.get(key)
+        if pdf_bytes is not None:
+            self._entries.move_to_end(key)
+        return pdf_bytes
+    
+    def put(self, key: bytes, pdf_bytes: bytes):
+        """Insert a PDF, evicting least recently used entries over the bounds."""
+        if len(pdf_bytes) > self.max_bytes or self.max_entries <= 0:
+            return
+        
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= len(previous)
+        
+        self._entries[key] = pdf_bytes
+        self.total_bytes += len(pdf_bytes)
+        
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+render_cache = RenderCache(RENDER_CACHE_MAX_ENTRIES, RENDER_CACHE_MAX_BYTES)
+
 
 def cleanup_old_pdfs():
     """Delete PDFs older than 1 hour."""
     now = time.time()
     deleted_count = 0
     
-    for pdf_file in TEMP_DIR.glob("*.pdf"):
-        try:
-            if now - pdf_file.stat().st_mtime > MAX_PDF_AGE:
-                pdf_file.unlink()
-                deleted_count += 1
-        except Exception as e:
-            logger.error(f"Cleanup error for {pdf_file.name}: {e}")
+    # scandir entries carry cached stat data, so each file is stat'ed at most once
+    with os.scandir(TEMP_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                if now - entry.stat().st_mtime > MAX_PDF_AGE:
+                    os.unlink(entry.path)
+                    deleted_count += 1
+            except Exception as e:
+                logger.error(f"Cleanup error for {entry.name}: {e}")
     
     if deleted_count > 0:
         logger.info(f"Cleaned up {deleted_count} old PDF(s)")
 
 
+def write_pdf_file(filepath: Path, data: bytes):
+    """
+    Write a PDF into the temp directory so it appears fully written.
+    
+    On Linux the data goes into an anonymous O_TMPFILE inode that is linked
+    under its final name once complete; elsewhere (or if the filesystem
+    does not support it) a temporary file is renamed into place.
+    
+    Args:
+        filepath: Final path of the PDF
+        data: PDF bytes
+    """
+    # Filenames are content-addressed, so an existing file already holds
+    # these bytes; just refresh its age so cleanup keeps it for another hour.
+    try:
+        os.utime(filepath)
+        return
+    except FileNotFoundError:
+        pass
+    
+    if hasattr(os, "O_TMPFILE"):
+        try:
+            fd = os.open(filepath.parent, os.O_TMPFILE | os.O_WRONLY, 0o600)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.link(f"/proc/self/fd/{fd}", filepath)
+            finally:
+                os.close(fd)
+            return
+        except FileExistsError:
+            # A concurrent request rendered the same bytes and linked them first
+            return
+        except OSError as e:
+            logger.debug(f"O_TMPFILE write failed, falling back to rename: {e}")
+    
+    # A unique partial name, so concurrent writers never share one
+    fd, partial = tempfile.mkstemp(dir=filepath.parent, prefix=filepath.name, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(partial, filepath)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+
+def iter_chunks(data: bytes, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[memoryview]:
+    """Yield zero-copy slices of a byte buffer for streaming responses."""
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+
+def parse_and_validate(raw_body: bytes) -> Tuple[Document, List[str]]:
+    """
+    Parse and validate a request body, repairing it only when needed.
+    
+    Well-formed payloads are parsed and validated straight from the request
+    bytes in a single native pass; the body is only decoded to text when the
+    JSON itself needs auto-repair.
+    
+    Args:
+        raw_body: Raw JSON request body
+        
+    Returns:
+        Tuple of (document, repairs_applied)
+        
+    Raises:
+        HTTPException: If the JSON cannot be repaired
+        ValidationError: If the document is still invalid after auto-fix
+    """
+    try:
+        return DOCUMENT_ADAPTER.validate_json(raw_body), []
+    except ValidationError:
+        pass
+    
+    # Try to parse and repair JSON
+    success, data, repairs_applied, error = AutoRepair.parse_bytes(raw_body)
+    if not success:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
+    
+    # Repair document structure
+    success, data, structure_repairs = AutoRepair.repair_document_structure(data)
+    repairs_applied.extend(structure_repairs)
+    
+    # Try to validate with Pydantic
+    try:
+        document = DOCUMENT_ADAPTER.validate_python(data)
+    except ValidationError as ve:
+        # Attempt auto-fix
+        logger.warning(f"Validation failed, attempting auto-fix: {ve}")
+        success, data, fix_repairs = AutoRepair.auto_fix_validation_error(data, ve)
+        repairs_applied.extend(fix_repairs)
+        
+        if not success:
+            raise
+        
+        # Try validation again
+        document = DOCUMENT_ADAPTER.validate_python(data)
+    
+    return document, repairs_applied
+
+
+async def render_in_pool(document: Document) -> Tuple[bytes, bool]:
+    """
+    Render a document in the worker pool without blocking the event loop.
+    
+    If a worker died and broke the pool, the pool is recreated and the
+    render retried once.
+    
+    Returns:
+        Tuple of (pdf_bytes, used_fallback)
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    try:
+        return await loop.run_in_executor(pool, render_document_with_status, document)
+    except BrokenProcessPool:
+        replace_broken_render_pool(pool)
+        return await loop.run_in_executor(get_render_pool(), render_document_with_status, document)
+
+
+async def render_cached(document: Document) -> bytes:
+    """
+    Return the PDF for a document, rendering it only on a cache miss.
+    
+    Renders that fell back to default fonts or image placeholders (e.g. after
+    a transient download failure) are not cached, so the next identical
+    request tries again.
+    """
+    key = RenderCache.key_for(document)
+    pdf_bytes = render_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes, used_fallback = await render_in_pool(document)
+        if used_fallback:
+            logger.info("Render used a font or image fallback; not caching it")
+        else:
+            render_cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+
+async def render_pipeline(raw_body: bytes, variant: Optional[str] = None) -> Tuple[Document, bytes, List[str], float]:
+    """
+    Repair, validate and render a request body.
+    
+    Shared by all render endpoints, which only differ in how they return
+    the PDF.
+    
+    Args:
+        raw_body: Raw request body
+        variant: Endpoint label used in log messages (e.g. "base64")
+        
+    Returns:
+        Tuple of (document, pdf_bytes, repairs_applied, render_time)
+        
+    Raises:
+        HTTPException: On validation or rendering errors
+    """
+    try:
+        start_time = time.time()
+        
+        document, repairs_applied = parse_and_validate(raw_body)
+        
+        # Render document
+        pdf_bytes = await render_cached(document)
+        
+        render_time = time.time() - start_time
+    
+    except HTTPException:
+        raise
+    
+    except ValidationError as e:
+        logger.error(f"Validation error (could not auto-fix): {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    
+    except ValueError as e:
+        logger.error(f"Value error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    
+    except Exception as e:
+        logger.error(f"Rendering error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Rendering error: {str(e)}")
+    
+    if repairs_applied:
+        logger.info(f"✓ Document repaired and rendered: {create_repair_summary(repairs_applied)}")
+    
+    label = f" ({variant})" if variant else ""
+    logger.info(f"Rendered document{label} with {len(document.blocks)} blocks in {render_time:.3f}s")
+    
+    return document, pdf_bytes, repairs_applied, render_time
+
+
+def add_repair_info(result: Dict[str, Any], repairs_applied: List[str]):
+    """Attach auto-repair details to a JSON response body."""
+    if repairs_applied:
+        result["auto_repairs"] = {
+            "count": len(repairs_applied),
+            "summary": create_repair_summary(repairs_applied),
+            "details": repairs_applied
+        }
+
+
 async def periodic_cleanup():
     """Run cleanup every 30 minutes."""
     while True:
         await asyncio.sleep(1800)  # 30 minutes
-        cleanup_old_pdfs()
+        # Directory scans and unlinks are blocking I/O; keep them off the event loop
+        await asyncio.to_thread(cleanup_old_pdfs)
 
 # Create FastAPI app
 app = FastAPI(
@@ -73,9 +431,6 @@ app = FastAPI(
     openapi_url="/openapi.json"
 )
 
-# Mount temp directory for serving PDFs
-app.mount("/temp-pdfs", StaticFiles(directory=str(TEMP_DIR)), name="temp_pdfs")
-
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -85,22 +440,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress only the compressible JSON endpoints
+app.add_middleware(PathScopedGZipMiddleware, paths=GZIP_PATH_PREFIXES)
+
 
 @app.on_event("startup")
 async def startup_event():
-    """Start background cleanup task."""
+    """Warm up the render workers and start background cleanup task."""
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    start_time = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            loop.run_in_executor(pool, warmup) for _ in range(RENDER_WORKERS)
+        ))
+        logger.info(f"Warmed up {RENDER_WORKERS} render worker(s) in {time.perf_counter() - start_time:.3f}s")
+    except Exception as e:
+        logger.warning(f"Render warmup failed: {e}")
+    
     asyncio.create_task(periodic_cleanup())
     logger.info("Started periodic PDF cleanup task")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the render worker processes."""
+    if render_pool is not None:
+        render_pool.shutdown(cancel_futures=True)
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all requests with timing information."""
-    start_time = time.time()
+    """Log requests with timing information (health checks and downloads excluded)."""
+    if not logger.isEnabledFor(logging.INFO) or request.scope["path"].startswith(UNLOGGED_PATH_PREFIXES):
+        return await call_next(request)
+    
+    start_time = time.perf_counter()
     
     response = await call_next(request)
     
-    duration = time.time() - start_time
+    duration = time.perf_counter() - start_time
     logger.info(
         f"{request.method} {request.url.path} "
         f"completed in {duration:.3f}s with status {response.status_code}"
@@ -134,90 +513,35 @@ async def render_pdf(request: Request) -> Response:
     Raises:
         HTTPException: On validation or rendering errors
     """
-    repairs_applied = []
-    
-    try:
-        start_time = time.time()
-        
-        # Read raw body for auto-repair
-        raw_body = await request.body()
-        raw_body = raw_body.decode('utf-8')
-        
-        # Try to parse and repair JSON
-        success, repaired_json, error = AutoRepair.repair_json(raw_body)
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
-        
-        if repaired_json != raw_body:
-            repairs_applied.append("JSON auto-repaired")
-        
-        # Parse JSON
-        data = json.loads(repaired_json)
-        
-        # Repair document structure
-        success, data, structure_repairs = AutoRepair.repair_document_structure(data)
-        repairs_applied.extend(structure_repairs)
-        
-        # Try to validate with Pydantic
-        try:
-            document = Document(**data)
-        except ValidationError as ve:
-            # Attempt auto-fix
-            logger.warning(f"Validation failed, attempting auto-fix: {ve}")
-            success, data, fix_repairs = AutoRepair.auto_fix_validation_error(data, ve)
-            repairs_applied.extend(fix_repairs)
-            
-            if success:
-                # Try validation again
-                document = Document(**data)
-            else:
-                raise ve
-        
-        # Render document
-        pdf_bytes = render_document(document)
-        
-        render_time = time.time() - start_time
-        
-        if repairs_applied:
-            logger.info(f"✓ Document repaired and rendered: {create_repair_summary(repairs_applied)}")
-        
-        logger.info(f"Rendered document with {len(document.blocks)} blocks in {render_time:.3f}s")
-        
-        # Return PDF with repair info in headers
-        headers = {
-            "Content-Disposition": f'attachment; filename="{document.meta.title or "document"}.pdf"',
-            "X-Render-Time": f"{render_time:.3f}"
-        }
-        
-        if repairs_applied:
-            headers["X-Auto-Repairs"] = str(len(repairs_applied))
-            headers["X-Repairs-Summary"] = create_repair_summary(repairs_applied)[:200]
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers=headers
-        )
+    document, pdf_bytes, repairs_applied, render_time = await render_pipeline(await request.body())
     
-    except ValidationError as e:
-        logger.error(f"Validation error (could not auto-fix): {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    # Return PDF with repair info in headers
+    headers = {
+        "Content-Disposition": f'attachment; filename="{document.meta.title or "document"}.pdf"',
+        "Content-Length": str(len(pdf_bytes)),
+        "X-Render-Time": f"{render_time:.3f}"
+    }
     
-    except ValueError as e:
-        logger.error(f"Value error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    if repairs_applied:
+        headers["X-Auto-Repairs"] = str(len(repairs_applied))
+        headers["X-Repairs-Summary"] = create_repair_summary(repairs_applied)[:200]
     
-    except Exception as e:
-        logger.error(f"Rendering error: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Rendering error: {str(e)}")
+    # Stream the PDF in chunks instead of copying it into a single body
+    return StreamingResponse(
+        iter_chunks(pdf_bytes),
+        media_type="application/pdf",
+        headers=headers
+    )
 
 
 @app.post("/render-base64")
-async def render_pdf_base64(request: Request) -> Dict[str, Any]:
+async def render_pdf_base64(request: Request) -> StreamingResponse:
     """
     Render a document to PDF and return as base64-encoded JSON with auto-repair.
     
     Useful for API clients (like ChatGPT) that cannot handle binary PDF responses.
+    The base64 payload is streamed between a pre-serialized JSON prefix and
+    suffix, so the multi-MB string is never copied into a combined document.
     
     Args:
         request: FastAPI request object
@@ -228,90 +552,40 @@ async def render_pdf_base64(request: Request) -> Dict[str, Any]:
     Raises:
         HTTPException: On validation or rendering errors
     """
-    repairs_applied = []
+    document, pdf_bytes, repairs_applied, render_time = await render_pipeline(
+        await request.body(), variant="base64"
+    )
     
-    try:
-        start_time = time.time()
-        
-        # Read raw body for auto-repair
-        raw_body = await request.body()
-        raw_body = raw_body.decode('utf-8')
-        
-        # Try to parse and repair JSON
-        success, repaired_json, error = AutoRepair.repair_json(raw_body)
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
-        
-        if repaired_json != raw_body:
-            repairs_applied.append("JSON auto-repaired")
-        
-        # Parse JSON
-        data = json.loads(repaired_json)
-        
-        # Repair document structure
-        success, data, structure_repairs = AutoRepair.repair_document_structure(data)
-        repairs_applied.extend(structure_repairs)
-        
-        # Try to validate with Pydantic
-        try:
-            document = Document(**data)
-        except ValidationError as ve:
-            logger.warning(f"Validation failed, attempting auto-fix: {ve}")
-            success, data, fix_repairs = AutoRepair.auto_fix_validation_error(data, ve)
-            repairs_applied.extend(fix_repairs)
-            
-            if success:
-                document = Document(**data)
-            else:
-                raise ve
-        
-        # Render document
-        pdf_bytes = render_document(document)
-        
-        render_time = time.time() - start_time
-        
-        if repairs_applied:
-            logger.info(f"✓ Document repaired and rendered: {create_repair_summary(repairs_applied)}")
-        
-        logger.info(f"Rendered document (base64) with {len(document.blocks)} blocks in {render_time:.3f}s")
-        
-        # Encode to base64
-        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-        
-        # Return JSON with repair info
-        result = {
-            "success": True,
-            "pdf_base64": pdf_base64,
-            "filename": f"{document.meta.title or 'document'}.pdf",
-            "size_bytes": len(pdf_bytes),
-            "render_time_seconds": round(render_time, 3),
-            "message": "PDF generated successfully. Decode pdf_base64 to get the binary PDF."
-        }
-        
-        if repairs_applied:
-            result["auto_repairs"] = {
-                "count": len(repairs_applied),
-                "summary": create_repair_summary(repairs_applied),
-                "details": repairs_applied
-            }
-        
-        return result
+    # Base64 output is plain ASCII and never needs JSON escaping
+    pdf_base64 = base64.b64encode(pdf_bytes)
     
-    except ValidationError as e:
-        logger.error(f"Validation error (could not auto-fix): {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    # Serialize the remaining fields once and splice the payload in front of them
+    result = {
+        "filename": f"{document.meta.title or 'document'}.pdf",
+        "size_bytes": len(pdf_bytes),
+        "render_time_seconds": round(render_time, 3),
+        "message": "PDF generated successfully. Decode pdf_base64 to get the binary PDF."
+    }
     
-    except ValueError as e:
-        logger.error(f"Value error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    add_repair_info(result, repairs_applied)
     
-    except Exception as e:
-        logger.error(f"Rendering error: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Rendering error: {str(e)}")
+    prefix = b'{"success":true,"pdf_base64":"'
+    suffix = b'",' + json_dumps(result)[1:]
+    
+    def body() -> Iterator[bytes]:
+        yield prefix
+        yield from iter_chunks(pdf_base64)
+        yield suffix
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/json",
+        headers={"Content-Length": str(len(prefix) + len(pdf_base64) + len(suffix))}
+    )
 
 
 @app.post("/render-url")
-async def render_pdf_url(request: Request) -> Dict[str, Any]:
+async def render_pdf_url(request: Request) -> FastJSONResponse:
     """
     Render a document to PDF and return a temporary download URL with auto-repair.
     
@@ -327,97 +601,68 @@ async def render_pdf_url(request: Request) -> Dict[str, Any]:
     Raises:
         HTTPException: On validation or rendering errors
     """
-    repairs_applied = []
+    document, pdf_bytes, repairs_applied, render_time = await render_pipeline(
+        await request.body(), variant="URL"
+    )
     
-    try:
-        start_time = time.time()
-        
-        # Read raw body for auto-repair
-        raw_body = await request.body()
-        raw_body = raw_body.decode('utf-8')
-        
-        # Try to parse and repair JSON
-        success, repaired_json, error = AutoRepair.repair_json(raw_body)
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
-        
-        if repaired_json != raw_body:
-            repairs_applied.append("JSON auto-repaired")
-        
-        # Parse JSON
-        data = json.loads(repaired_json)
-        
-        # Repair document structure
-        success, data, structure_repairs = AutoRepair.repair_document_structure(data)
-        repairs_applied.extend(structure_repairs)
-        
-        # Try to validate with Pydantic
-        try:
-            document = Document(**data)
-        except ValidationError as ve:
-            logger.warning(f"Validation failed, attempting auto-fix: {ve}")
-            success, data, fix_repairs = AutoRepair.auto_fix_validation_error(data, ve)
-            repairs_applied.extend(fix_repairs)
-            
-            if success:
-                document = Document(**data)
-            else:
-                raise ve
-        
-        # Render document
-        pdf_bytes = render_document(document)
-        
-        render_time = time.time() - start_time
-        
-        if repairs_applied:
-            logger.info(f"✓ Document repaired and rendered: {create_repair_summary(repairs_applied)}")
-        
-        logger.info(f"Rendered document (URL) with {len(document.blocks)} blocks in {render_time:.3f}s")
-        
-        # Generate unique filename
-        file_id = str(uuid.uuid4())[:8]
-        filename = f"{file_id}_{document.meta.title or 'document'}.pdf".replace(" ", "_")
-        filepath = TEMP_DIR / filename
-        
-        # Save PDF to temp directory
-        with open(filepath, "wb") as f:
-            f.write(pdf_bytes)
-        
-        # Build absolute URL
-        base_url = str(request.base_url).rstrip('/')
-        pdf_url = f"{base_url}/temp-pdfs/{filename}"
-        
-        # Return JSON with URL and repair info
-        result = {
-            "success": True,
-            "pdf_url": pdf_url,
-            "filename": f"{document.meta.title or 'document'}.pdf",
-            "size_bytes": len(pdf_bytes),
-            "render_time_seconds": round(render_time, 3),
-            "expires_in": "1 hour",
-            "message": "PDF generated successfully. Download it from pdf_url before it expires."
-        }
+    # Name the file by a hash of the PDF itself, so a file left over from an
+    # older renderer (temp files outlive restarts) is never served for new
+    # output; render-cache hits return identical bytes and share one file
+    file_id = hashlib.blake2b(pdf_bytes, digest_size=6).hexdigest()
+    title = (document.meta.title or 'document').translate(FILENAME_SAFE_TABLE)
+    filename = f"{file_id}_{title}.pdf"
+    filepath = (TEMP_DIR / filename).resolve()
+    
+    if not filepath.is_relative_to(TEMP_DIR.resolve()):
+        raise HTTPException(status_code=400, detail="Invalid document title for filename")
+    
+    # Save PDF to temp directory (off the event loop)
+    await asyncio.to_thread(write_pdf_file, filepath, pdf_bytes)
+    
+    # Build absolute URL
+    base_url = str(request.base_url).rstrip('/')
+    pdf_url = f"{base_url}/temp-pdfs/{urllib.parse.quote(filename)}"
+    
+    # Return JSON with URL and repair info
+    result = {
+        "success": True,
+        "pdf_url": pdf_url,
+        "filename": f"{document.meta.title or 'document'}.pdf",
+        "size_bytes": len(pdf_bytes),
+        "render_time_seconds": round(render_time, 3),
+        "expires_in": "1 hour",
+        "message": "PDF generated successfully. Download it from pdf_url before it expires."
+    }
+    
+    add_repair_info(result, repairs_applied)
+    
+    return FastJSONResponse(result)
+
+
+@app.api_route("/temp-pdfs/{filename}", methods=["GET", "HEAD"])
+async def serve_temp_pdf(filename: str) -> FileResponse:
+    """
+    Serve a PDF generated by /render-url.
+    
+    FileResponse hands the file to the server's sendfile path when available,
+    so the bytes are not copied through Python. HEAD requests (link checkers,
+    download managers) get the headers only.
+    
+    Args:
+        filename: Name of the PDF inside the temp directory
         
-        if repairs_applied:
-            result["auto_repairs"] = {
-                "count": len(repairs_applied),
-                "summary": create_repair_summary(repairs_applied),
-                "details": repairs_applied
-            }
+    Returns:
+        PDF file response
         
-        return result
-    
-    except ValidationError as e:
-        logger.error(f"Validation error (could not auto-fix): {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    Raises:
+        HTTPException: If the file does not exist or lies outside the temp directory
+    """
+    filepath = (TEMP_DIR / filename).resolve()
     
-    except ValueError as e:
-        logger.error(f"Value error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    if not filepath.is_relative_to(TEMP_DIR.resolve()) or not filepath.is_file():
+        raise HTTPException(status_code=404, detail="PDF not found or expired")
     
-    except Exception as e:
-        logger.error(f"Rendering error: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Rendering error: {str(e)}")
+    return FileResponse(filepath, media_type="application/pdf")
 
 
 @app.exception_handler(413)
@@ -441,4 +686,6 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop and httptools ship with uvicorn[standard]; requests are already
+    # logged by the log_requests middleware, so uvicorn's access log is off
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", access_log=False)
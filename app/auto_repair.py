@@ -7,20 +7,252 @@ encoding issues, syntax errors, and other common API problems.
 License: MIT
 """
 
+import functools
 import json
 import re
 import logging
 from typing import Any, Dict, Tuple, Optional
 from pydantic import ValidationError
 
+from app.models import RichText
+
+# Rust-backed JSON parsing when available
+try:
+    import orjson
+    
+    def json_loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN/Infinity and integers wider than 64 bits,
+            # which the stdlib parser accepts
+            return json.loads(data)
+except ImportError:
+    json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# Control characters deleted in a single str.translate pass
+CONTROL_CHARS_TABLE = dict.fromkeys(
+    [*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), 0x7f]
+)
+
+# Single-pass, string-aware scanner for AutoRepair.repair_json. Strings are
+# matched first, so comments, quotes and commas inside them are left alone.
+# String bodies use the unrolled "normal* (special normal*)*" form, which
+# consumes plain runs in one step and cannot backtrack catastrophically.
+JSON_TOKEN_PATTERN = re.compile(r"""
+    (?P<string>"[^"\\]*(?:\\.[^"\\]*)*")
+  | (?P<single_key>'[^'\\]*(?:\\.[^'\\]*)*')(?=\s*:)
+  | (?<![\w$])(?P<bare_key>[A-Za-z_$][\w$]*)(?=\s*:)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<trailing_comma>,)(?=\s*[}\]])
+""", re.DOTALL | re.VERBOSE)
+
+# Raw whitespace control characters that must be escaped inside JSON strings
+STRING_ESCAPE_TABLE = str.maketrans({'\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+# Regex passes that still run after the scanner, compiled once at import
+MISSING_COMMA_STRING_PATTERN = re.compile(r'"\s*\n\s*"')
+MISSING_COMMA_NUMBER_PATTERN = re.compile(r'(\d)\s*\n\s*"')
+MISSING_COMMA_BOOL_PATTERN = re.compile(r'(true|false)\s*\n\s*"')
+BRACKET_PATTERN = re.compile(r'[{}\[\]]')
+
+# Repair notes reported for each scanner token kind
+SCAN_REPAIR_NOTES = {
+    'string': "Escaped newlines in strings",
+    'single_key': "Converted single-quoted keys",
+    'bare_key': "Quoted unquoted keys",
+    'comment': "Removed comments",
+    'trailing_comma': "Removed trailing commas",
+}
+
+
+def _scan_and_repair(raw_data: str) -> Tuple[str, list]:
+    """
+    Fix trailing commas, single-quoted and unquoted keys, raw newlines in
+    strings and comments in one left-to-right pass.
+    
+    Args:
+        raw_data: JSON text with control characters already stripped
+        
+    Returns:
+        Tuple of (repaired_text, repairs_applied)
+    """
+    found = set()
+    
+    def repair_token(match):
+        kind = match.lastgroup
+        token = match.group(kind)
+        if kind == 'string':
+            escaped = token.translate(STRING_ESCAPE_TABLE)
+            if len(escaped) != len(token):
+                found.add(kind)
+            return escaped
+        found.add(kind)
+        if kind == 'single_key':
+            key = token[1:-1].replace("\\'", "'").replace('"', '\\"')
+            return f'"{key}"'
+        if kind == 'bare_key':
+            return f'"{token}"'
+        return ''
+    
+    repaired = JSON_TOKEN_PATTERN.sub(repair_token, raw_data)
+    return repaired, [note for kind, note in SCAN_REPAIR_NOTES.items() if kind in found]
+
+
+def _resolve_path(data: Any, path: tuple) -> Any:
+    """
+    Follow a Pydantic error location into the raw data.
+    
+    Discriminated-union locations include the block's type tag as an extra
+    segment (e.g. ``blocks.0.heading.level``), which is skipped here.
+    
+    Args:
+        data: Raw document data
+        path: Location segments to follow
+        
+    Returns:
+        The referenced object, or None if the path does not exist
+    """
+    current = data
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(current, list) or not 0 <= key < len(current):
+                return None
+            current = current[key]
+        elif isinstance(current, dict):
+            if key in current:
+                current = current[key]
+            elif current.get("type") != key:
+                return None
+        else:
+            return None
+    return current
+
+
+# Encodings tried by AutoRepair.repair_encoding when UTF-8 decoding fails
+FALLBACK_ENCODINGS = ('cp1252', 'latin-1')
+
+# Key signatures used to infer a missing block type, checked in order
+TYPE_INFERENCE_RULES = (
+    (frozenset({"level", "text"}), "heading"),
+    (frozenset({"text"}), "paragraph"),
+    (frozenset({"latex"}), "formula"),
+)
+
+
+def _infer_block_type(block: Dict[str, Any]) -> Optional[str]:
+    """Infer the type of a block without a 'type' key, or None if unknown."""
+    keys = block.keys()
+    for signature, block_type in TYPE_INFERENCE_RULES:
+        if signature <= keys:
+            return block_type
+    
+    if "content" in keys:
+        # Array of blocks means card; anything else is treated as code
+        content = block["content"]
+        if isinstance(content, list) and content and isinstance(content[0], dict):
+            return "card"
+        return "code"
+    
+    return None
+
+
+def _fix_heading(block: Dict[str, Any], i: str, repairs: list) -> bool:
+    """Ensure a heading has a valid level."""
+    if "level" not in block:
+        block["level"] = 1
+        repairs.append(f"Added default level 1 to heading block #{i}")
+    elif not isinstance(block["level"], int) or block["level"] not in [1, 2, 3]:
+        block["level"] = 1
+        repairs.append(f"Fixed invalid heading level in block #{i}")
+    return True
+
+
+def _fix_formula(block: Dict[str, Any], i: str, repairs: list) -> bool:
+    """Drop formulas without LaTeX."""
+    if "latex" not in block:
+        repairs.append(f"Skipped formula block #{i} (missing latex)")
+        return False
+    return True
+
+
+def _fix_list(block: Dict[str, Any], i: str, repairs: list) -> bool:
+    """Fill in a default variant and items for lists."""
+    if "variant" not in block:
+        block["variant"] = "bullet"
+        repairs.append(f"Added default variant to list block #{i}")
+    if "items" not in block:
+        block["items"] = []
+        repairs.append(f"Added empty items to list block #{i}")
+    return True
+
+
+# Per-type fix-ups applied by AutoRepair.repair_document_structure
+BLOCK_FIXERS = {
+    "heading": _fix_heading,
+    "formula": _fix_formula,
+    "list": _fix_list,
+}
+
+
+def _repair_blocks(blocks: list, repairs: list, prefix: str = "") -> list:
+    """Fix up a list of blocks, recursing into card content."""
+    fixed_blocks = []
+    for index, block in enumerate(blocks):
+        i = f"{prefix}{index}"
+        if not isinstance(block, dict):
+            repairs.append(f"Skipped invalid block #{i} (not an object)")
+            continue
+        
+        # Ensure block has type
+        if "type" not in block:
+            inferred = _infer_block_type(block)
+            if inferred is None:
+                repairs.append(f"Skipped block #{i} (cannot infer type)")
+                continue
+            block["type"] = inferred
+            repairs.append(f"Inferred block #{i} type as '{inferred}'")
+        
+        # Fix text fields (ensure they're arrays of RichText). Spans built
+        # here are already valid, so they skip validation via model_construct.
+        if "text" in block:
+            if isinstance(block["text"], str):
+                block["text"] = [RichText.model_construct(text=block["text"])]
+                repairs.append(f"Converted block #{i} text to RichText array")
+            elif isinstance(block["text"], list):
+                fixed_text = []
+                for j, span in enumerate(block["text"]):
+                    if isinstance(span, str):
+                        fixed_text.append(RichText.model_construct(text=span))
+                        repairs.append(f"Converted block #{i} span #{j} to RichText")
+                    elif isinstance(span, dict) and "text" in span:
+                        fixed_text.append(span)
+                    else:
+                        repairs.append(f"Skipped invalid span in block #{i}")
+                block["text"] = fixed_text
+        
+        # Type-specific fix-ups (a fixer returns False to drop the block)
+        block_type = block["type"]
+        fixer = BLOCK_FIXERS.get(block_type) if isinstance(block_type, str) else None
+        if fixer is not None and not fixer(block, i, repairs):
+            continue
+        
+        # Blocks nested in a card get the same treatment
+        if block_type == "card" and isinstance(block.get("content"), list):
+            block["content"] = _repair_blocks(block["content"], repairs, f"{i}.")
+        
+        fixed_blocks.append(block)
+    
+    return fixed_blocks
+
 
 class AutoRepair:
     """Automatic error detection and repair for API payloads."""
     
     @staticmethod
-    def repair_json(raw_data: str) -> Tuple[bool, str, Optional[str]]:
+    def repair_json(raw_data: str) -> Tuple[bool, str, Optional[Any], list, Optional[str]]:
         """
         Attempt to repair malformed JSON.
         
@@ -28,83 +260,67 @@ class AutoRepair:
             raw_data: Raw JSON string (potentially malformed)
             
         Returns:
-            Tuple of (success, repaired_json, error_message)
+            Tuple of (success, repaired_json, parsed_data, repairs_applied, error_message)
         """
-        if not raw_data or not isinstance(raw_data, str):
-            return False, raw_data, "Empty or invalid input"
-        
-        original = raw_data
         repairs_applied = []
         
+        if not raw_data or not isinstance(raw_data, str):
+            return False, raw_data, None, repairs_applied, "Empty or invalid input"
+        
         # Try parsing as-is first
         try:
-            json.loads(raw_data)
-            return True, raw_data, None
+            return True, raw_data, json_loads(raw_data), repairs_applied, None
         except json.JSONDecodeError as e:
             logger.info(f"JSON parsing failed: {e}. Attempting auto-repair...")
         
-        # Repair 1: Strip BOM and invisible characters
+        # Repair 1: Strip a leading BOM
         if raw_data.startswith('\ufeff'):
             raw_data = raw_data.lstrip('\ufeff')
             repairs_applied.append("Removed BOM")
         
         # Repair 2: Remove control characters
-        raw_data = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', raw_data)
+        stripped = raw_data.translate(CONTROL_CHARS_TABLE)
+        if len(stripped) != len(raw_data):
+            repairs_applied.append("Removed control characters")
+        raw_data = stripped
         
-        # Repair 3: Fix common trailing comma issues
-        raw_data = re.sub(r',(\s*[}\]])', r'\1', raw_data)
-        if raw_data != original:
-            repairs_applied.append("Removed trailing commas")
+        # Repair 3: Trailing commas, single-quoted and unquoted keys, newlines
+        # in strings and comments, fixed together by one string-aware scan
+        raw_data, scan_repairs = _scan_and_repair(raw_data)
+        repairs_applied.extend(scan_repairs)
         
         # Repair 4: Fix missing commas between properties
-        raw_data = re.sub(r'"\s*\n\s*"', '",\n  "', raw_data)
-        raw_data = re.sub(r'(\d)\s*\n\s*"', r'\1,\n  "', raw_data)
-        raw_data = re.sub(r'(true|false)\s*\n\s*"', r'\1,\n  "', raw_data)
-        
-        # Repair 5: Fix unescaped quotes in strings
-        # Match strings and escape internal quotes
-        def escape_quotes(match):
-            content = match.group(1)
-            # Don't escape already escaped quotes
-            content = re.sub(r'(?<!\\)"', r'\\"', content)
-            return f'"{content}"'
-        
-        # Be careful with this - only apply to obvious string values
-        raw_data = re.sub(r'"([^"]*(?:\\"[^"]*)*)"', escape_quotes, raw_data)
-        
-        # Repair 6: Fix single quotes to double quotes (common mistake)
-        # Only outside of already-quoted strings
-        raw_data = re.sub(r"'([^']*)':", r'"\1":', raw_data)
-        
-        # Repair 7: Remove trailing content after valid JSON
-        # Find the last closing brace/bracket
-        bracket_depth = 0
-        brace_depth = 0
-        last_valid_pos = -1
-        
-        for i, char in enumerate(raw_data):
-            if char == '{':
-                brace_depth += 1
-            elif char == '}':
-                brace_depth -= 1
-            elif char == '[':
-                bracket_depth += 1
-            elif char == ']':
-                bracket_depth -= 1
-            
-            if brace_depth == 0 and bracket_depth == 0 and i > 0:
-                if raw_data[i-1] in '}]':
-                    last_valid_pos = i
-                    break
+        raw_data, string_count = MISSING_COMMA_STRING_PATTERN.subn('",\n  "', raw_data)
+        raw_data, number_count = MISSING_COMMA_NUMBER_PATTERN.subn(r'\1,\n  "', raw_data)
+        raw_data, bool_count = MISSING_COMMA_BOOL_PATTERN.subn(r'\1,\n  "', raw_data)
+        if string_count or number_count or bool_count:
+            repairs_applied.append("Added missing commas")
         
-        if last_valid_pos > 0 and last_valid_pos < len(raw_data) - 1:
-            raw_data = raw_data[:last_valid_pos]
-            repairs_applied.append("Removed trailing content")
-        
-        # Repair 8: Fix missing closing braces/brackets
+        # Repair 5: Balance braces/brackets and drop trailing content.
+        # str.count scans in C; the structural walk only runs when the
+        # payload is balanced but does not end on a closing brace/bracket.
         brace_count = raw_data.count('{') - raw_data.count('}')
         bracket_count = raw_data.count('[') - raw_data.count(']')
         
+        if brace_count == 0 and bracket_count == 0 and not raw_data.rstrip().endswith(('}', ']')):
+            brace_depth = 0
+            bracket_depth = 0
+            for match in BRACKET_PATTERN.finditer(raw_data):
+                char = match.group()
+                if char == '{':
+                    brace_depth += 1
+                elif char == '}':
+                    brace_depth -= 1
+                elif char == '[':
+                    bracket_depth += 1
+                else:
+                    bracket_depth -= 1
+                
+                if brace_depth == 0 and bracket_depth == 0 and char in '}]':
+                    raw_data = raw_data[:match.end()]
+                    repairs_applied.append("Removed trailing content")
+                    break
+        
         if brace_count > 0:
             raw_data += '}' * brace_count
             repairs_applied.append(f"Added {brace_count} closing brace(s)")
@@ -113,22 +329,45 @@ class AutoRepair:
             raw_data += ']' * bracket_count
             repairs_applied.append(f"Added {bracket_count} closing bracket(s)")
         
-        # Repair 9: Fix newlines in strings (convert to \n)
-        raw_data = re.sub(r':\s*"([^"]*)\n([^"]*)"', r': "\1\\n\2"', raw_data)
-        
-        # Repair 10: Remove comments (not valid JSON but common)
-        raw_data = re.sub(r'//[^\n]*\n', '\n', raw_data)
-        raw_data = re.sub(r'/\*.*?\*/', '', raw_data, flags=re.DOTALL)
-        
         # Try parsing repaired JSON
         try:
-            parsed = json.loads(raw_data)
+            parsed = json_loads(raw_data)
             logger.info(f"✓ JSON repaired successfully. Repairs: {', '.join(repairs_applied)}")
-            return True, raw_data, None
+            return True, raw_data, parsed, repairs_applied, None
         except json.JSONDecodeError as e:
             error_msg = f"Could not repair JSON after {len(repairs_applied)} attempts: {str(e)}"
             logger.warning(error_msg)
-            return False, raw_data, error_msg
+            return False, raw_data, None, repairs_applied, error_msg
+    
+    @staticmethod
+    def parse_bytes(raw_bytes: bytes) -> Tuple[bool, Any, list, Optional[str]]:
+        """
+        Parse a raw request body, decoding and repairing it only if needed.
+        
+        Valid JSON is parsed straight from the bytes without building an
+        intermediate str; repair_encoding and repair_json only run when that
+        fails.
+        
+        Args:
+            raw_bytes: Raw request body
+            
+        Returns:
+            Tuple of (success, parsed_data, repairs_applied, error_message)
+        """
+        try:
+            return True, json_loads(raw_bytes), [], None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass
+        
+        success, raw_text, error = AutoRepair.repair_encoding(raw_bytes)
+        if not success:
+            return False, None, [], error
+        
+        success, _, data, repairs, error = AutoRepair.repair_json(raw_text)
+        if not success:
+            return False, None, [], error
+        
+        return True, data, repairs, None
     
     @staticmethod
     def repair_document_structure(data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any], list]:
@@ -157,83 +396,7 @@ class AutoRepair:
             repairs.append("Converted 'blocks' to array")
         
         # Fix block structure issues
-        fixed_blocks = []
-        for i, block in enumerate(data.get("blocks", [])):
-            if not isinstance(block, dict):
-                repairs.append(f"Skipped invalid block #{i} (not an object)")
-                continue
-            
-            # Ensure block has type
-            if "type" not in block:
-                # Try to infer type
-                if "level" in block and "text" in block:
-                    block["type"] = "heading"
-                    repairs.append(f"Inferred block #{i} type as 'heading'")
-                elif "text" in block:
-                    block["type"] = "paragraph"
-                    repairs.append(f"Inferred block #{i} type as 'paragraph'")
-                elif "latex" in block:
-                    block["type"] = "formula"
-                    repairs.append(f"Inferred block #{i} type as 'formula'")
-                elif "content" in block and isinstance(block["content"], list):
-                    # Check if content is array of blocks (card) or string (code)
-                    if block["content"] and isinstance(block["content"], list) and isinstance(block["content"][0], dict):
-                        block["type"] = "card"
-                        repairs.append(f"Inferred block #{i} type as 'card'")
-                    else:
-                        block["type"] = "code"
-                        repairs.append(f"Inferred block #{i} type as 'code'")
-                elif "content" in block:
-                    block["type"] = "code"
-                    repairs.append(f"Inferred block #{i} type as 'code'")
-                else:
-                    repairs.append(f"Skipped block #{i} (cannot infer type)")
-                    continue
-            
-            # Fix text fields (ensure they're arrays of RichText)
-            if "text" in block:
-                if isinstance(block["text"], str):
-                    block["text"] = [{"text": block["text"]}]
-                    repairs.append(f"Converted block #{i} text to RichText array")
-                elif isinstance(block["text"], list):
-                    fixed_text = []
-                    for j, span in enumerate(block["text"]):
-                        if isinstance(span, str):
-                            fixed_text.append({"text": span})
-                            repairs.append(f"Converted block #{i} span #{j} to RichText")
-                        elif isinstance(span, dict) and "text" in span:
-                            fixed_text.append(span)
-                        else:
-                            repairs.append(f"Skipped invalid span in block #{i}")
-                    block["text"] = fixed_text
-            
-            # Fix heading levels
-            if block.get("type") == "heading":
-                if "level" not in block:
-                    block["level"] = 1
-                    repairs.append(f"Added default level 1 to heading block #{i}")
-                elif not isinstance(block["level"], int) or block["level"] not in [1, 2, 3]:
-                    block["level"] = 1
-                    repairs.append(f"Fixed invalid heading level in block #{i}")
-            
-            # Fix formula blocks
-            if block.get("type") == "formula":
-                if "latex" not in block:
-                    repairs.append(f"Skipped formula block #{i} (missing latex)")
-                    continue
-            
-            # Fix list blocks
-            if block.get("type") == "list":
-                if "variant" not in block:
-                    block["variant"] = "bullet"
-                    repairs.append(f"Added default variant to list block #{i}")
-                if "items" not in block:
-                    block["items"] = []
-                    repairs.append(f"Added empty items to list block #{i}")
-            
-            fixed_blocks.append(block)
-        
-        data["blocks"] = fixed_blocks
+        data["blocks"] = _repair_blocks(data.get("blocks", []), repairs)
         
         return True, data, repairs
     
@@ -242,23 +405,36 @@ class AutoRepair:
         """
         Attempt to decode bytes with various encodings.
         
+        Pure-ASCII and UTF-8 payloads (the common case) decode in a single
+        pass; legacy encodings are only tried when UTF-8 fails.
+        
         Args:
             raw_bytes: Raw byte data
             
         Returns:
             Tuple of (success, decoded_string, error_message)
         """
-        encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
+        if not isinstance(raw_bytes, (bytes, bytearray)):
+            return False, "", "Input is not bytes"
+        
+        if raw_bytes.isascii():
+            return True, raw_bytes.decode('ascii'), None
+        
+        try:
+            return True, raw_bytes.decode('utf-8'), None
+        except UnicodeDecodeError:
+            pass
         
-        for encoding in encodings:
+        # cp1252 is tried before latin-1, which accepts any byte sequence
+        for encoding in FALLBACK_ENCODINGS:
             try:
                 decoded = raw_bytes.decode(encoding)
                 logger.info(f"Successfully decoded with {encoding}")
                 return True, decoded, None
-            except (UnicodeDecodeError, AttributeError):
+            except UnicodeDecodeError:
                 continue
         
-        error_msg = f"Could not decode with any encoding: {encodings}"
+        error_msg = f"Could not decode with any encoding: {['utf-8', *FALLBACK_ENCODINGS]}"
         logger.warning(error_msg)
         return False, "", error_msg
     
@@ -275,7 +451,16 @@ class AutoRepair:
             Tuple of (success, fixed_data, repairs_applied)
         """
         repairs = []
-        errors = error.errors()
+        # Only 'loc' and 'type' are used, so skip building the other details
+        errors = error.errors(include_url=False, include_context=False, include_input=False)
+        
+        # Errors on sibling fields share a parent; resolve each path once
+        resolved: Dict[tuple, Any] = {}
+        
+        def resolve(path: tuple) -> Any:
+            if path not in resolved:
+                resolved[path] = _resolve_path(data, path)
+            return resolved[path]
         
         for err in errors:
             loc = err['loc']
@@ -283,16 +468,9 @@ class AutoRepair:
             
             # Fix missing required fields
             if err_type == 'missing':
-                # Navigate to parent and add default
-                target = data
-                for key in loc[:-1]:
-                    if isinstance(key, int):
-                        if isinstance(target, list) and key < len(target):
-                            target = target[key]
-                        else:
-                            break
-                    else:
-                        target = target.get(key, {})
+                target = resolve(loc[:-1])
+                if not isinstance(target, dict):
+                    continue
                 
                 missing_field = loc[-1]
                 
@@ -312,25 +490,36 @@ class AutoRepair:
             
             # Fix invalid literal values
             elif err_type.startswith('literal_error'):
-                target = data
-                for key in loc[:-1]:
-                    if isinstance(key, int) and isinstance(target, list):
-                        target = target[key]
-                    else:
-                        target = target.get(key, {})
+                target = resolve(loc[:-1])
                 
                 field = loc[-1]
-                if field == "type":
+                if field == "type" and isinstance(target, dict):
                     # Default to paragraph for unknown types
                     target[field] = "paragraph"
                     repairs.append(f"Changed invalid type to 'paragraph' at {'.'.join(map(str, loc))}")
+            
+            # Fix unknown or missing block type tags (loc points at the block itself)
+            elif err_type in ('union_tag_invalid', 'union_tag_not_found'):
+                target = resolve(loc)
+                
+                if isinstance(target, dict):
+                    # Infer from the block's fields, defaulting to paragraph
+                    inferred = _infer_block_type(target) or "paragraph"
+                    target["type"] = inferred
+                    repairs.append(f"Changed invalid type to '{inferred}' at {'.'.join(map(str, loc))}.type")
         
         return len(repairs) > 0, data, repairs
 
 
+@functools.lru_cache(maxsize=128)
+def _format_repair_summary(repairs: Tuple[str, ...]) -> str:
+    """Join repair notes into a summary (cached per distinct repair list)."""
+    return f"{len(repairs)} repair(s): " + "; ".join(repairs)
+
+
 def create_repair_summary(repairs: list) -> str:
     """Create a human-readable summary of repairs."""
     if not repairs:
         return "No repairs needed"
     
-    return f"{len(repairs)} repair(s): " + "; ".join(repairs)
+    return _format_repair_summary(tuple(repairs))
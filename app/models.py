@@ -7,8 +7,8 @@ validation for all content blocks and rich text formatting.
 License: MIT
 """
 
-from typing import List as ListType, Optional, Union, Literal
-from pydantic import BaseModel, Field, field_validator
+from typing import List as ListType, Optional, Union, Literal, Annotated
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 
 
 class RichText(BaseModel):
@@ -16,7 +16,11 @@ class RichText(BaseModel):
     Rich text span with inline formatting.
     
     Supports bold, italic, code, highlighting, colored text, and emoji hints.
+    Spans are immutable (and hashable) once validated; use model_copy to
+    derive modified spans.
     """
+    model_config = ConfigDict(frozen=True)
+    
     text: str = Field(..., description="Text content")
     bold: bool = Field(default=False, description="Bold formatting")
     italic: bool = Field(default=False, description="Italic formatting")
@@ -137,6 +141,7 @@ class ExerciseArea(BaseModel):
     type: Literal["exercise"] = "exercise"
     variant: Literal["ruled", "dotgrid", "square", "blank"] = Field(..., description="Exercise area style")
     height_mm: float = Field(..., ge=10, le=200, description="Height in millimeters")
+    border: bool = Field(default=True, description="Draw the rounded outline around the area")
 
 
 class Card(BaseModel):
@@ -158,20 +163,23 @@ class Card(BaseModel):
     show: bool = Field(default=True, description="If False, the card and its content are not rendered (invisible)")
 
 
-# Union type for all block types
-Block = Union[
-    Heading,
-    Paragraph,
-    Caption,
-    ListBlock,
-    Break,
-    PageBreak,
-    Code,
-    Formula,
-    Table,
-    Image,
-    ExerciseArea,
-    Card,
+# Union type for all block types, dispatched on the "type" tag
+Block = Annotated[
+    Union[
+        Heading,
+        Paragraph,
+        Caption,
+        ListBlock,
+        Break,
+        PageBreak,
+        Code,
+        Formula,
+        Table,
+        Image,
+        ExerciseArea,
+        Card,
+    ],
+    Field(discriminator="type"),
 ]
 
 
@@ -212,3 +220,9 @@ class Document(BaseModel):
 # Update forward references
 ListItem.model_rebuild()
 Card.model_rebuild()
+
+# Validator built once at import; reuse it instead of re-resolving per call
+DOCUMENT_ADAPTER = TypeAdapter(Document)
+
+# JSON schema of the request payload, generated once instead of per lookup
+DOCUMENT_SCHEMA = Document.model_json_schema()
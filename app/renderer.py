@@ -7,26 +7,58 @@ with deterministic, production-quality output.
 License: MIT
 """
 
+import array
+import dataclasses
+import hashlib
 import io
+import itertools
+import json
 import math
+import operator
 import os
 import re
 import tempfile
+import threading
 import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, List as ListType
+from typing import Dict, Iterator, List, Tuple, Optional, List as ListType
 
 import matplotlib
-from matplotlib import mathtext, rcParams
+from matplotlib import rcParams
+from matplotlib.font_manager import FontProperties
+from matplotlib.path import Path as MplPath
+from matplotlib.textpath import TextPath, text_to_path
 
 matplotlib.use("Agg")
 rcParams["mathtext.fontset"] = "stix"
 rcParams["font.family"] = "STIXGeneral"
 
 INLINE_MATH_PATTERN = re.compile(r"(?<!\\)\$(.+?)(?<!\\)\$")
-
+UNSAFE_FONT_NAME_PATTERN = re.compile(r"[^A-Za-z0-9_-]")
+TTF_URL_PATTERN = re.compile(r"url\(([^)]+\.ttf)\)")
+FONT_FACE_PATTERN = re.compile(r"@font-face\s*\{([^}]*)\}")
+FONT_STYLE_PATTERN = re.compile(r"font-style:\s*(\w+)")
+FONT_WEIGHT_PATTERN = re.compile(r"font-weight:\s*(\d+)")
+# (font-style, font-weight) of a Google Fonts @font-face rule -> variant name
+FONT_FACE_VARIANTS = {
+    ("normal", "400"): "regular",
+    ("italic", "400"): "italic",
+    ("normal", "700"): "bold",
+    ("italic", "700"): "bold-italic",
+}
+WHITESPACE_SPLIT_PATTERN = re.compile(r"(\s+)")
+# Bare identifiers like $x$ or $a_{12}$ that are set as italic text, not mathtext
+SIMPLE_MATH_PATTERN = re.compile(r"\s*([A-Za-z])(?:_(?:\{([A-Za-z0-9]+)\}|([A-Za-z0-9])))?\s*")
+SUBSCRIPT_SCALE = 0.7
+SUBSCRIPT_DROP = 0.2
+
+from PIL import Image as PILImage
 from reportlab.lib.pagesizes import A4, LETTER
 from reportlab.pdfgen import canvas
+from reportlab.pdfgen.canvas import FILL_NON_ZERO
+from reportlab.pdfgen.pathobject import PDFPathObject
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -42,6 +74,90 @@ from app.styles import (
 )
 
 
+# Shared opener for font and image downloads. Like urlopen it honours the
+# proxy environment variables (HTTPS_PROXY, NO_PROXY, ...) and follows
+# redirects; its default User-Agent makes Google Fonts serve TTF files.
+FONT_FETCH_TIMEOUT = 15
+_url_opener = urllib.request.build_opener()
+
+# Font variants are downloaded in parallel (one per style)
+_font_download_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="font-download")
+
+
+def _http_get(url: str, timeout: float = FONT_FETCH_TIMEOUT) -> bytes:
+    """
+    Fetch a URL through the shared opener.
+    
+    Args:
+        url: HTTP or HTTPS URL to fetch
+        timeout: Socket timeout in seconds
+        
+    Returns:
+        Response body
+        
+    Raises:
+        urllib.error.HTTPError: On error statuses
+        OSError: On connection errors
+    """
+    with _url_opener.open(url, timeout=timeout) as response:
+        return response.read()
+
+
+# Remote images are fetched in parallel before layout starts
+IMAGE_FETCH_TIMEOUT = 30
+
+# Resolution assumed for images that do not record one (1 px = 1 pt)
+IMAGE_DEFAULT_DPI = 72
+
+# Images with more pixels than this resolution needs at their display size
+# are downsampled before embedding
+IMAGE_EMBED_DPI = 300
+_image_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="image-fetch")
+
+
+def _fetch_image(url: str) -> bytes:
+    """Download a remote image."""
+    return _http_get(url, timeout=IMAGE_FETCH_TIMEOUT)
+
+
+# TTF fonts already registered with ReportLab in this process
+_REGISTERED_FONTS = set()
+
+
+def _register_font(name: str, path: str):
+    """Register a TTF font with ReportLab once per process."""
+    if name not in _REGISTERED_FONTS:
+        pdfmetrics.registerFont(TTFont(name, path))
+        _REGISTERED_FONTS.add(name)
+
+
+# Unit-size advance widths of the 256 Latin-1 code points, per font name
+_LATIN1_WIDTH_TABLES: Dict[str, array.array] = {}
+
+
+def _latin1_width_table(font_name: str) -> array.array:
+    """Return (building once per process) the Latin-1 width table for a font."""
+    table = _LATIN1_WIDTH_TABLES.get(font_name)
+    if table is None:
+        table = array.array('d', [pdfmetrics.stringWidth(chr(code), font_name, 1.0) for code in range(256)])
+        _LATIN1_WIDTH_TABLES[font_name] = table
+    return table
+
+
+def _download_font_file(url: str, font_path: str):
+    """Download a font file into the cache, renaming it into place when complete."""
+    font_data = _http_get(url)
+    partial_path = f"{font_path}.{threading.get_ident()}.part"
+    with open(partial_path, 'wb') as f:
+        f.write(font_data)
+    os.replace(partial_path, font_path)
+
+
+# Variant paths of fonts downloaded (or found on disk) in this process,
+# keyed by (font_family, cache_dir); failures are not remembered
+_FONT_FILES: Dict[Tuple[str, str], dict] = {}
+
+
 def download_google_font(font_family: str, cache_dir: str = None) -> dict:
     """
     Download Google Font TTF files and return paths for different styles.
@@ -56,6 +172,10 @@ def download_google_font(font_family: str, cache_dir: str = None) -> dict:
     if cache_dir is None:
         cache_dir = os.path.join(tempfile.gettempdir(), 'pdf_fonts')
     
+    font_files = _FONT_FILES.get((font_family, cache_dir))
+    if font_files:
+        return font_files
+    
     os.makedirs(cache_dir, exist_ok=True)
     
     # Replace spaces with plus signs for URL
@@ -64,42 +184,71 @@ def download_google_font(font_family: str, cache_dir: str = None) -> dict:
     # Google Fonts CSS API - order matters: regular, italic, bold, bold-italic
     css_url = f"https://fonts.googleapis.com/css2?family={font_name_url}:ital,wght@0,400;1,400;0,700;1,700&display=swap"
     
+    # Reuse the variant mapping from a previous download when all files are
+    # present; the manifest is keyed by the CSS request so that changing the
+    # requested variants invalidates it
+    safe_name = UNSAFE_FONT_NAME_PATTERN.sub('_', font_family)
+    request_key = hashlib.sha1(css_url.encode('utf-8')).hexdigest()[:12]
+    manifest_path = os.path.join(cache_dir, f"{safe_name}_{request_key}.json")
+    try:
+        with open(manifest_path) as f:
+            cached_files = json.load(f)
+        if cached_files and all(os.path.exists(path) for path in cached_files.values()):
+            _FONT_FILES[(font_family, cache_dir)] = cached_files
+            return cached_files
+    except (OSError, ValueError):
+        pass
+    
     font_files = {}
     
     try:
         # Download CSS to get TTF URLs
-        with urllib.request.urlopen(css_url) as response:
-            css_content = response.read().decode('utf-8')
-        
-        # Parse CSS to find TTF URLs (simplified parser)
-        import re
-        ttf_urls = re.findall(r'url\(([^)]+\.ttf)\)', css_content)
+        css_content = _http_get(css_url).decode('utf-8')
+        
+        # Map each @font-face rule to its variant by style and weight, so a
+        # family missing some variants cannot shift the others
+        ttf_urls = {}
+        for face in FONT_FACE_PATTERN.findall(css_content):
+            style = FONT_STYLE_PATTERN.search(face)
+            weight = FONT_WEIGHT_PATTERN.search(face)
+            url = TTF_URL_PATTERN.search(face)
+            if style and weight and url:
+                variant = FONT_FACE_VARIANTS.get((style.group(1), weight.group(1)))
+                if variant:
+                    ttf_urls.setdefault(variant, url.group(1))
         
         if not ttf_urls:
             raise ValueError(f"No TTF files found for font '{font_family}'")
         
-        # Download each variant - order matches CSS request: regular, italic, bold, bold-italic
-        variants = ['regular', 'italic', 'bold', 'bold-italic']
-        for i, ttf_url in enumerate(ttf_urls[:4]):  # Get up to 4 variants
-            variant = variants[i] if i < len(variants) else 'regular'
-            
+        # Download each variant
+        downloads = []
+        for variant, ttf_url in ttf_urls.items():
             # Create safe filename
-            font_filename = f"{font_family.replace(' ', '_')}_{variant}.ttf"
+            font_filename = f"{safe_name}_{variant}.ttf"
             font_path = os.path.join(cache_dir, font_filename)
             
-            # Download if not cached
+            # Download if not cached (uncached variants are fetched concurrently)
+            future = None
             if not os.path.exists(font_path):
-                with urllib.request.urlopen(ttf_url) as response:
-                    font_data = response.read()
-                with open(font_path, 'wb') as f:
-                    f.write(font_data)
-            
+                future = _font_download_pool.submit(_download_font_file, ttf_url, font_path)
+            downloads.append((variant, font_path, future))
+        
+        for variant, font_path, future in downloads:
+            if future is not None:
+                future.result()
             font_files[variant] = font_path
         
         # Ensure we have at least regular
         if 'regular' not in font_files and font_files:
             font_files['regular'] = list(font_files.values())[0]
         
+        # Record the mapping so later renders skip the CSS request
+        partial_path = f"{manifest_path}.{threading.get_ident()}.part"
+        with open(partial_path, 'w') as f:
+            json.dump(font_files, f)
+        os.replace(partial_path, manifest_path)
+        
+        _FONT_FILES[(font_family, cache_dir)] = font_files
         return font_files
         
     except Exception as e:
@@ -114,6 +263,32 @@ class PDFRenderer:
     Maintains cursor position, handles pagination, and renders all block types.
     """
     
+    # Math outlines are shared by every document rendered in this process,
+    # bounded as an LRU so long-lived workers do not grow without limit
+    MATH_CACHE_MAX_ENTRIES = 512
+    _math_path_cache: "OrderedDict[Tuple[str, float], Tuple[Optional[PDFPathObject], float, float, float]]" = OrderedDict()
+    
+    @classmethod
+    def clear_math_cache(cls):
+        """Drop all cached math outlines and metrics."""
+        cls._math_path_cache.clear()
+    
+    @staticmethod
+    def _cache_get(cache: OrderedDict, key):
+        """Look up a math cache entry, marking it most recently used."""
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+    
+    @classmethod
+    def _cache_put(cls, cache: OrderedDict, key, value):
+        """Store a math cache entry, evicting the least recently used ones."""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > cls.MATH_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+    
     def __init__(self, document: Document):
         """
         Initialize renderer with document.
@@ -122,13 +297,6 @@ class PDFRenderer:
             document: Document model containing meta and blocks
         """
         self.document = document
-        self.buffer = io.BytesIO()
-
-        # Math rendering utilities
-        self._math_parser = mathtext.MathTextParser("agg")
-        self._math_dpi = 300
-        self._math_cache: Dict[Tuple[str, float, Tuple[float, float, float]], Tuple[bytes, float, float, float]] = {}
-        self._math_metrics_cache: Dict[Tuple[str, float], Tuple[float, float, float]] = {}
         
         # Page configuration
         if document.meta.page_size == "A4":
@@ -148,60 +316,44 @@ class PDFRenderer:
         self.content_width = self.page_width - self.margin_left - self.margin_right
         self.content_height = self.page_height - self.margin_top - self.margin_bottom
         
+        # Unit-size text widths keyed by (font_name, text)
+        self._width_cache: Dict[Tuple[str, str], float] = {}
+        
+        # Math form XObject names keyed by (latex, font_size)
+        self._math_forms: Dict[Tuple[str, float], str] = {}
+        
+        # Exercise-area pattern form names keyed by (variant, width, height)
+        self._pattern_forms: Dict[Tuple[str, float, float], str] = {}
+        
         # Cursor position (y coordinate, grows downward from top)
         self.y = self.page_height - self.margin_top
         self.x = self.margin_left
         
-        # Custom fonts
-        self.custom_fonts = fonts  # Default fonts from styles
+        # Custom fonts (a per-document copy, so overrides never leak into the shared defaults)
+        self.custom_fonts = dataclasses.replace(fonts)
+        self._build_font_table()
         
-        # Download and register Google Font if specified
-        if document.meta.font_family:
-            try:
-                font_files = download_google_font(document.meta.font_family)
-                
-                if font_files:
-                    # Register fonts with ReportLab
-                    font_base_name = document.meta.font_family.replace(' ', '')
-                    
-                    if 'regular' in font_files:
-                        pdfmetrics.registerFont(TTFont(f'{font_base_name}-Regular', font_files['regular']))
-                        self.custom_fonts.body = f'{font_base_name}-Regular'
-                        self.custom_fonts.heading = f'{font_base_name}-Regular'
-                    
-                    if 'bold' in font_files:
-                        pdfmetrics.registerFont(TTFont(f'{font_base_name}-Bold', font_files['bold']))
-                        self.custom_fonts.bold = f'{font_base_name}-Bold'
-                    elif 'regular' in font_files:
-                        self.custom_fonts.bold = f'{font_base_name}-Regular'
-                    
-                    if 'italic' in font_files:
-                        pdfmetrics.registerFont(TTFont(f'{font_base_name}-Italic', font_files['italic']))
-                        self.custom_fonts.italic = f'{font_base_name}-Italic'
-                        self.custom_fonts.caption = f'{font_base_name}-Italic'
-                    elif 'regular' in font_files:
-                        self.custom_fonts.italic = f'{font_base_name}-Regular'
-                        self.custom_fonts.caption = f'{font_base_name}-Regular'
-                    
-                    if 'bold-italic' in font_files:
-                        pdfmetrics.registerFont(TTFont(f'{font_base_name}-BoldItalic', font_files['bold-italic']))
-                        self.custom_fonts.bold_italic = f'{font_base_name}-BoldItalic'
-                    elif 'bold' in font_files:
-                        self.custom_fonts.bold_italic = self.custom_fonts.bold
-                    elif 'italic' in font_files:
-                        self.custom_fonts.bold_italic = self.custom_fonts.italic
-                    else:
-                        self.custom_fonts.bold_italic = self.custom_fonts.body
-                    
-                    print(f"Successfully loaded Google Font: {document.meta.font_family}")
-                else:
-                    print(f"Warning: Could not load Google Font '{document.meta.font_family}', using defaults")
-            
-            except Exception as e:
-                print(f"Error loading Google Font: {e}")
+        # Remote image downloads keyed by URL, started before any layout
+        self._image_fetches: Dict[str, Future] = {}
+        self._image_readers: Dict[str, ImageReader] = {}
+        self._scaled_images: Dict[Tuple[str, Tuple[int, int]], ImageReader] = {}
+        self._prefetch_images(document.blocks)
+        
+        # Google Font is downloaded and registered on first text render
+        self._font_ready = not document.meta.font_family
         
-        # Canvas
-        self.c = canvas.Canvas(self.buffer, pagesize=(self.page_width, self.page_height))
+        # Set when a font or image could not be loaded and a fallback was
+        # drawn instead; such output may differ on the next attempt
+        self.used_fallback = False
+        
+        # Canvas (no output file; render() takes the finished bytes directly)
+        self.c = canvas.Canvas(None, pagesize=(self.page_width, self.page_height))
+        
+        # Last font and fill color emitted on the current page
+        self._current_font: Optional[Tuple[str, float]] = None
+        self._current_fill: Optional[Tuple[float, float, float]] = None
+        self._current_stroke: Optional[Tuple[float, float, float]] = None
+        self._current_line_width: Optional[float] = None
         
         # Set metadata
         if document.meta.title:
@@ -211,6 +363,22 @@ class PDFRenderer:
         
         # List counters (for numbered lists)
         self.list_counter = 0
+        
+        # Block type -> render method, so dispatch is one dict lookup per block
+        self._block_renderers = {
+            Heading: self._render_heading,
+            Paragraph: self._render_paragraph,
+            Caption: self._render_caption,
+            ListBlock: self._render_list,
+            Break: self._render_break,
+            PageBreak: lambda block: self._render_page_break(),
+            Code: self._render_code,
+            Formula: self._render_formula,
+            Table: self._render_table,
+            Image: self._render_image,
+            ExerciseArea: self._render_exercise_area,
+            Card: self._render_card,
+        }
     
     def render(self) -> bytes:
         """
@@ -223,43 +391,162 @@ class PDFRenderer:
         for block in self.document.blocks:
             self._render_block(block)
         
-        # Finalize
-        self.c.save()
-        return self.buffer.getvalue()
+        # Finalize: getpdfdata() hands back the serialized document as-is,
+        # instead of writing it into a BytesIO and copying it out again
+        pdf_bytes = self.c.getpdfdata()
+        self._cleanup()
+        return pdf_bytes
+    
+    def _cleanup(self):
+        """Release per-document caches once the PDF is written."""
+        self._image_fetches.clear()
+        self._image_readers.clear()
+        self._scaled_images.clear()
+        self._width_cache.clear()
+        self._math_forms.clear()
+        self._pattern_forms.clear()
+    
+    def _prefetch_images(self, blocks: ListType[Block]):
+        """Start downloading every remote image in the blocks (and nested cards)."""
+        for block in blocks:
+            if isinstance(block, Image):
+                src = block.src
+                if src.startswith(('http://', 'https://')) and src not in self._image_fetches:
+                    self._image_fetches[src] = _image_fetch_pool.submit(_fetch_image, src)
+            elif isinstance(block, Card):
+                self._prefetch_images(block.content)
+    
+    def _ensure_custom_font(self):
+        """
+        Download and register the document's Google Font on first use.
+        
+        Documents made only of images, code, and breaks never touch the
+        network or parse a TTF file.
+        """
+        if self._font_ready:
+            return
+        self._font_ready = True
+        
+        try:
+            font_files = download_google_font(self.document.meta.font_family)
+            
+            if font_files:
+                # Register fonts with ReportLab
+                font_base_name = self.document.meta.font_family.replace(' ', '')
+                
+                if 'regular' in font_files:
+                    _register_font(f'{font_base_name}-Regular', font_files['regular'])
+                    self.custom_fonts.body = f'{font_base_name}-Regular'
+                    self.custom_fonts.heading = f'{font_base_name}-Regular'
+                
+                if 'bold' in font_files:
+                    _register_font(f'{font_base_name}-Bold', font_files['bold'])
+                    self.custom_fonts.bold = f'{font_base_name}-Bold'
+                elif 'regular' in font_files:
+                    self.custom_fonts.bold = f'{font_base_name}-Regular'
+                
+                if 'italic' in font_files:
+                    _register_font(f'{font_base_name}-Italic', font_files['italic'])
+                    self.custom_fonts.italic = f'{font_base_name}-Italic'
+                    self.custom_fonts.caption = f'{font_base_name}-Italic'
+                elif 'regular' in font_files:
+                    self.custom_fonts.italic = f'{font_base_name}-Regular'
+                    self.custom_fonts.caption = f'{font_base_name}-Regular'
+                
+                if 'bold-italic' in font_files:
+                    _register_font(f'{font_base_name}-BoldItalic', font_files['bold-italic'])
+                    self.custom_fonts.bold_italic = f'{font_base_name}-BoldItalic'
+                elif 'bold' in font_files:
+                    self.custom_fonts.bold_italic = self.custom_fonts.bold
+                elif 'italic' in font_files:
+                    self.custom_fonts.bold_italic = self.custom_fonts.italic
+                else:
+                    self.custom_fonts.bold_italic = self.custom_fonts.body
+                
+                self._build_font_table()
+                print(f"Successfully loaded Google Font: {self.document.meta.font_family}")
+            else:
+                self.used_fallback = True
+                print(f"Warning: Could not load Google Font '{self.document.meta.font_family}', using defaults")
+        
+        except Exception as e:
+            self.used_fallback = True
+            print(f"Error loading Google Font: {e}")
     
     def _render_block(self, block: Block):
         """Render a single block based on its type."""
-        if isinstance(block, Heading):
-            self._render_heading(block)
-        elif isinstance(block, Paragraph):
-            self._render_paragraph(block)
-        elif isinstance(block, Caption):
-            self._render_caption(block)
-        elif isinstance(block, ListBlock):
-            self._render_list(block)
-        elif isinstance(block, Break):
-            self._render_break(block)
-        elif isinstance(block, PageBreak):
-            self._render_page_break()
-        elif isinstance(block, Code):
-            self._render_code(block)
-        elif isinstance(block, Formula):
-            self._render_formula(block)
-        elif isinstance(block, Table):
-            self._render_table(block)
-        elif isinstance(block, Image):
-            self._render_image(block)
-        elif isinstance(block, ExerciseArea):
-            self._render_exercise_area(block)
-        elif isinstance(block, Card):
-            self._render_card(block)
+        if not isinstance(block, (Break, PageBreak, Code, Image)):
+            self._ensure_custom_font()
+        
+        render_method = self._block_renderers.get(type(block))
+        if render_method is None:
+            # Subclasses of a block model fall back to an isinstance match
+            for block_type, method in self._block_renderers.items():
+                if isinstance(block, block_type):
+                    render_method = method
+                    break
+            else:
+                return
+        render_method(block)
     
     def _check_page_break(self, required_height: float):
         """Check if we need a page break and create one if necessary."""
         if self.y - required_height < self.margin_bottom:
-            self.c.showPage()
+            self._show_page()
             self.y = self.page_height - self.margin_top
     
+    def _set_font(self, font_name: str, font_size: float):
+        """Select a font, skipping the operator when it is already current."""
+        state = (font_name, font_size)
+        if self._current_font != state:
+            self.c.setFont(font_name, font_size)
+            self._current_font = state
+    
+    def _set_fill_color(self, rgb: Tuple[float, float, float]):
+        """Set the fill color, skipping the operator when it is already current."""
+        if self._current_fill != rgb:
+            self.c.setFillColorRGB(*rgb)
+            self._current_fill = rgb
+    
+    def _set_stroke_color(self, rgb: Tuple[float, float, float]):
+        """Set the stroke color, skipping the operator when it is already current."""
+        if self._current_stroke != rgb:
+            self.c.setStrokeColorRGB(*rgb)
+            self._current_stroke = rgb
+    
+    def _set_line_width(self, width: float):
+        """Set the line width, skipping the operator when it is already current."""
+        if self._current_line_width != width:
+            self.c.setLineWidth(width)
+            self._current_line_width = width
+    
+    def _draw_highlight(self, color: Tuple[float, float, float], x: float, y: float,
+                        width: float, height: float):
+        """
+        Draw a translucent rounded highlight box behind a span.
+        
+        Only the fill alpha is reset afterwards; the next span sets its own
+        color through the tracked fill state, so no saveState is needed.
+        """
+        padding = 1
+        self._set_fill_color(color)
+        self.c.setFillAlpha(0.35)
+        self.c.roundRect(x - padding, y - padding, width + padding * 2, height + padding * 2,
+                         2, fill=1, stroke=0)
+        self.c.setFillAlpha(1)
+    
+    def _show_page(self):
+        """Finish the current page and start a new one."""
+        self.c.showPage()
+        self._reset_graphics_state()
+    
+    def _reset_graphics_state(self):
+        """Forget the tracked font, colors and line width (a new page starts from defaults)."""
+        self._current_font = None
+        self._current_fill = None
+        self._current_stroke = None
+        self._current_line_width = None
+    
     def _render_heading(self, heading: Heading):
         """Render a heading block with rich text support."""
         # Map level to font size
@@ -286,7 +573,7 @@ class PDFRenderer:
                     if getattr(span, "math", False):
                         total_text_width += self._measure_math_width(span.text, font_size)
                     else:
-                        total_text_width += self.c.stringWidth(span.text, self._get_font_name(span), font_size)
+                        total_text_width += self._text_width(span.text, self._get_font_name(span), font_size)
                 extra_space = (self.content_width - total_text_width) / max(len(line_spans) - 1, 1)
             else:
                 # Left align for single-line or last line
@@ -304,7 +591,7 @@ class PDFRenderer:
         self.y -= spacing.paragraph_gap - 4
         
         # Reset color
-        self.c.setFillColorRGB(*colors.text_primary)
+        self._set_fill_color(colors.text_primary)
     
     def _render_paragraph(self, paragraph: Paragraph):
         """Render a paragraph block with rich text support, wrapping, and justification."""
@@ -327,7 +614,7 @@ class PDFRenderer:
                     if getattr(span, "math", False):
                         total_text_width += self._measure_math_width(span.text, font_sizes.body)
                     else:
-                        total_text_width += self.c.stringWidth(span.text, self._get_font_name(span), font_sizes.body)
+                        total_text_width += self._text_width(span.text, self._get_font_name(span), font_sizes.body)
                 extra_space = (self.content_width - total_text_width) / max(len(line_spans) - 1, 1)
             else:
                 # Left align for single-line or last line
@@ -344,18 +631,44 @@ class PDFRenderer:
         
         self.y -= spacing.paragraph_gap - 4
     
+    def _text_width(self, text: str, font_name: str, font_size: float) -> float:
+        """
+        Measure text width in points, memoized per (font, text).
+        
+        Widths scale linearly with size, so the unit-size advance is cached
+        and repeated words (articles, prepositions, spaces) skip ReportLab's
+        per-glyph summation. New Latin-1 words (ASCII and accented Western
+        European text) are summed from a per-font width table instead.
+        """
+        key = (font_name, text)
+        unit_width = self._width_cache.get(key)
+        if unit_width is None:
+            try:
+                codes = text.encode('latin-1')
+            except UnicodeEncodeError:
+                unit_width = pdfmetrics.stringWidth(text, font_name, 1.0)
+            else:
+                table = _latin1_width_table(font_name)
+                unit_width = sum([table[code] for code in codes])
+            self._width_cache[key] = unit_width
+        return unit_width * font_size
+
+    def _build_font_table(self):
+        """Map every (code, bold, italic) span style to its font name."""
+        fonts_by_style = {
+            (False, False): self.custom_fonts.body,
+            (True, False): self.custom_fonts.bold,
+            (False, True): self.custom_fonts.italic,
+            (True, True): self.custom_fonts.bold_italic,
+        }
+        self._font_table: Dict[Tuple[bool, bool, bool], str] = {}
+        for (bold, italic), font_name in fonts_by_style.items():
+            self._font_table[(False, bold, italic)] = font_name
+            self._font_table[(True, bold, italic)] = self.custom_fonts.code
+
     def _get_font_name(self, span: RichText) -> str:
         """Get font name for a rich text span."""
-        if span.code:
-            return self.custom_fonts.code
-        elif span.bold and span.italic:
-            return self.custom_fonts.bold_italic
-        elif span.bold:
-            return self.custom_fonts.bold
-        elif span.italic:
-            return self.custom_fonts.italic
-        else:
-            return self.custom_fonts.body
+        return self._font_table[(span.code, span.bold, span.italic)]
 
     def _resolve_span_color(self, span: RichText, use_black: bool = False) -> Tuple[float, float, float]:
         """Determine the RGB color for a span."""
@@ -365,53 +678,45 @@ class PDFRenderer:
             return TEXT_COLORS[span.color]
         return colors.text_primary
 
-    @staticmethod
-    def _color_tuple_to_hex(color: Tuple[float, float, float]) -> str:
-        """Convert an RGB tuple (0-1) to hex string."""
-        r, g, b = [max(0, min(255, int(round(component * 255)))) for component in color]
-        return f"#{r:02x}{g:02x}{b:02x}"
-
-    def _expand_inline_spans(self, spans: ListType[RichText]) -> ListType[RichText]:
-        """Expand spans to isolate inline math segments."""
-        expanded: ListType[RichText] = []
+    def _iter_expanded_spans(self, spans: ListType[RichText]) -> Iterator[RichText]:
+        """Yield spans with inline math segments isolated."""
         for span in spans:
-            expanded.extend(self._split_span_for_inline_math(span))
-        return expanded
+            yield from self._split_span_for_inline_math(span)
 
-    def _split_span_for_inline_math(self, span: RichText) -> ListType[RichText]:
+    def _split_span_for_inline_math(self, span: RichText) -> Iterator[RichText]:
         """Split a span into text and inline math segments."""
-        if getattr(span, "math", False):
-            return [span]
-
         text = span.text
-        if not text or '$' not in text:
-            return [span]
+        if span.math or not text or '$' not in text:
+            yield span
+            return
 
+        # Escaped dollars are masked so they are not taken as delimiters
         placeholder = "\uF8FF"
-        sanitized = text.replace("\\$", placeholder)
+        sanitized = text.replace("\\$", placeholder) if "\\$" in text else text
 
-        segments: ListType[RichText] = []
+        split = False
         last_index = 0
         for match in INLINE_MATH_PATTERN.finditer(sanitized):
             start, end = match.span()
             if start > last_index:
                 prefix = sanitized[last_index:start].replace(placeholder, '$')
                 if prefix:
-                    segments.append(span.model_copy(update={"text": prefix, "math": False}))
+                    split = True
+                    yield span.model_copy(update={"text": prefix, "math": False})
             formula = match.group(1)
             if formula:
-                segments.append(span.model_copy(update={"text": formula.replace(placeholder, '$'), "math": True}))
+                split = True
+                yield span.model_copy(update={"text": formula.replace(placeholder, '$'), "math": True})
             last_index = end
 
-        if not segments:
-            return [span]
+        if not split:
+            yield span
+            return
 
         if last_index < len(sanitized):
             suffix = sanitized[last_index:].replace(placeholder, '$')
             if suffix:
-                segments.append(span.model_copy(update={"text": suffix, "math": False}))
-
-        return segments if segments else [span]
+                yield span.model_copy(update={"text": suffix, "math": False})
 
     def _format_math_expression(self, latex: str) -> str:
         """Ensure math expression is wrapped for MathText."""
@@ -428,127 +733,154 @@ class PDFRenderer:
             return f"${expr[2:-2]}$"
         return f"${expr}$"
 
-    def _get_math_metrics(self, latex: str, font_size: float) -> Tuple[float, float, float]:
-        """Get width, height, depth for math expression in points."""
+    def _get_math_path(self, latex: str, font_size: float) -> Tuple[Optional[PDFPathObject], float, float, float]:
+        """
+        Convert a math expression to vector glyph outlines, once per size.
+        
+        The outline is built relative to the expression's left baseline
+        point and is reused for every placement and color.
+        
+        Args:
+            latex: LaTeX math expression
+            font_size: Font size in points
+            
+        Returns:
+            Tuple of (path or None, width, height, depth) in points
+        """
         key = (latex, font_size)
-        if key in self._math_metrics_cache:
-            return self._math_metrics_cache[key]
+        cached = self._cache_get(self._math_path_cache, key)
+        if cached is not None:
+            return cached
 
+        result = (None, 0.0, 0.0, 0.0)
         expr = self._format_math_expression(latex)
-        if not expr:
-            metrics = (0.0, 0.0, 0.0)
-        else:
-            buffer = io.BytesIO()
+        if expr:
             try:
-                width_px, height_px, depth_px = self._math_parser.to_png(
-                    buffer,
-                    expr,
-                    dpi=self._math_dpi,
-                    fontsize=font_size,
-                    color='black'
-                )
-            except Exception as error:
-                print(f"Warning: failed to measure math expression '{latex}': {error}")
-                width_px = height_px = depth_px = 0
-            finally:
-                buffer.close()
-
-            width_pt = width_px * 72.0 / self._math_dpi
-            height_pt = height_px * 72.0 / self._math_dpi
-            depth_pt = depth_px * 72.0 / self._math_dpi
-            metrics = (width_pt, height_pt, depth_pt)
-
-        self._math_metrics_cache[key] = metrics
-        return metrics
-
-    def _get_math_image(self, latex: str, font_size: float, color: Tuple[float, float, float]) -> Tuple[bytes, float, float, float]:
-        """Render math expression to image bytes with metrics."""
-        key = (latex, font_size, color)
-        if key in self._math_cache:
-            return self._math_cache[key]
-
-        expr = self._format_math_expression(latex)
-        if not expr:
-            data = (b"", 0.0, 0.0, 0.0)
-        else:
-            buffer = io.BytesIO()
-            hex_color = self._color_tuple_to_hex(color)
-            try:
-                width_px, height_px, depth_px = self._math_parser.to_png(
-                    buffer,
-                    expr,
-                    dpi=self._math_dpi,
-                    fontsize=font_size,
-                    color=hex_color
-                )
+                prop = FontProperties(size=font_size)
+                width_pt, height_pt, depth_pt = text_to_path.get_text_width_height_descent(expr, prop, ismath=True)
+                outline = TextPath((0, 0), expr, size=font_size, prop=prop)
+                result = (self._outline_to_pdf_path(outline), width_pt, height_pt, depth_pt)
             except Exception as error:
                 print(f"Warning: failed to render math expression '{latex}': {error}")
-                buffer.close()
-                self._math_cache[key] = (b"", 0.0, 0.0, 0.0)
-                return self._math_cache[key]
 
-            img_bytes = buffer.getvalue()
-            buffer.close()
+        self._cache_put(self._math_path_cache, key, result)
+        return result
 
-            width_pt = width_px * 72.0 / self._math_dpi
-            height_pt = height_px * 72.0 / self._math_dpi
-            depth_pt = depth_px * 72.0 / self._math_dpi
-            data = (img_bytes, width_pt, height_pt, depth_pt)
+    @staticmethod
+    def _outline_to_pdf_path(outline: MplPath) -> PDFPathObject:
+        """Translate a matplotlib path into a ReportLab path (quadratics become cubics)."""
+        path = PDFPathObject()
+        current = (0.0, 0.0)
+        for vertices, code in outline.iter_segments(curves=True, simplify=False):
+            if code == MplPath.MOVETO:
+                current = (vertices[0], vertices[1])
+                path.moveTo(*current)
+            elif code == MplPath.LINETO:
+                current = (vertices[0], vertices[1])
+                path.lineTo(*current)
+            elif code == MplPath.CURVE3:
+                qx, qy, x, y = vertices
+                path.curveTo(
+                    current[0] + 2.0 / 3.0 * (qx - current[0]), current[1] + 2.0 / 3.0 * (qy - current[1]),
+                    x + 2.0 / 3.0 * (qx - x), y + 2.0 / 3.0 * (qy - y),
+                    x, y
+                )
+                current = (x, y)
+            elif code == MplPath.CURVE4:
+                path.curveTo(*vertices)
+                current = (vertices[4], vertices[5])
+            elif code == MplPath.CLOSEPOLY:
+                path.close()
+        return path
 
-            self._math_metrics_cache.setdefault((latex, font_size), (width_pt, height_pt, depth_pt))
+    def _get_math_metrics(self, latex: str, font_size: float) -> Tuple[float, float, float]:
+        """Get width, height, depth for math expression in points."""
+        _, width_pt, height_pt, depth_pt = self._get_math_path(latex, font_size)
+        return width_pt, height_pt, depth_pt
 
-        self._math_cache[key] = data
-        return data
+    def _draw_math_path(self, latex: str, font_size: float, x: float, baseline_y: float,
+                        color: Tuple[float, float, float]):
+        """
+        Fill a math outline with its left baseline point at (x, baseline_y).
+        
+        Each distinct expression is written once per document as a form
+        XObject; repeated occurrences only reference it. The form carries no
+        color, so it inherits the fill color set before each placement.
+        """
+        key = (latex, font_size)
+        form_name = self._math_forms.get(key)
+        if form_name is None:
+            path, width_pt, height_pt, depth_pt = self._get_math_path(latex, font_size)
+            if path is None:
+                return
+            form_name = f"math{len(self._math_forms)}"
+            # Glyph outlines may overshoot the reported metrics slightly
+            pad = font_size
+            self.c.beginForm(form_name, -pad, -depth_pt - pad, width_pt + pad, height_pt + pad)
+            self.c.drawPath(path, stroke=0, fill=1, fillMode=FILL_NON_ZERO)
+            self.c.endForm()
+            self._math_forms[key] = form_name
+
+        self.c.saveState()
+        self.c.translate(x, baseline_y)
+        self.c.setFillColorRGB(*color)
+        self.c.doForm(form_name)
+        self.c.restoreState()
 
     def _measure_math_width(self, latex: str, font_size: float) -> float:
         """Measure inline math width in points."""
+        simple = SIMPLE_MATH_PATTERN.fullmatch(latex)
+        if simple:
+            base, braced, single = simple.groups()
+            subscript = braced or single
+            width = self._text_width(base, self.custom_fonts.italic, font_size)
+            if subscript:
+                width += self._text_width(subscript, self.custom_fonts.italic, font_size * SUBSCRIPT_SCALE)
+            return width
         width, _, _ = self._get_math_metrics(latex, font_size)
         return width
 
+    def _render_simple_math(self, base: str, subscript: Optional[str], span: RichText,
+                            x: float, y: float, base_size: float, use_black: bool = False) -> float:
+        """Draw a bare identifier such as $x$ or $a_i$ as italic text and return new x position."""
+        base_span = span.model_copy(update={"text": base, "math": False, "bold": False,
+                                            "italic": True, "code": False})
+        x = self._render_rich_text_span(base_span, x, y, base_size, use_black)
+        if subscript:
+            sub_size = base_size * SUBSCRIPT_SCALE
+            self._set_font(self.custom_fonts.italic, sub_size)
+            self.c.drawString(x, y - base_size - base_size * SUBSCRIPT_DROP, subscript)
+            x += self._text_width(subscript, self.custom_fonts.italic, sub_size)
+        return x
+
     def _render_inline_math_span(self, span: RichText, x: float, y: float,
                                   base_size: float, use_black: bool = False) -> float:
         """Render inline math and return new x position."""
+        simple = SIMPLE_MATH_PATTERN.fullmatch(span.text)
+        if simple:
+            base, braced, single = simple.groups()
+            return self._render_simple_math(base, braced or single, span, x, y, base_size, use_black)
+
         color_rgb = self._resolve_span_color(span, use_black)
-        img_bytes, width_pt, height_pt, depth_pt = self._get_math_image(span.text, base_size, color_rgb)
+        path, width_pt, height_pt, depth_pt = self._get_math_path(span.text, base_size)
 
-        if not img_bytes or width_pt == 0:
+        if path is None or width_pt == 0:
             return x
 
         baseline_y = y - base_size
         bottom_y = baseline_y - depth_pt
 
         if span.highlight and span.highlight in HIGHLIGHT_COLORS:
-            highlight_color = HIGHLIGHT_COLORS[span.highlight]
-            padding = 1
-            self.c.saveState()
-            self.c.setFillColorRGB(highlight_color[0], highlight_color[1], highlight_color[2], alpha=0.35)
-            self.c.roundRect(
-                x - padding,
-                bottom_y - padding,
-                width_pt + padding * 2,
-                height_pt + padding * 2,
-                2,
-                fill=1,
-                stroke=0
-            )
-            self.c.restoreState()
+            self._draw_highlight(HIGHLIGHT_COLORS[span.highlight], x, bottom_y, width_pt, height_pt)
 
-        image_reader = ImageReader(io.BytesIO(img_bytes))
-        self.c.drawImage(
-            image_reader,
-            x,
-            bottom_y,
-            width=width_pt,
-            height=height_pt,
-            mask='auto'
-        )
+        self._draw_math_path(span.text, base_size, x, baseline_y, color_rgb)
 
         return x + width_pt
 
     def _render_inline_sequence(self, spans: ListType[RichText], x: float, y: float,
                                  base_size: float, use_black: bool = False) -> float:
         """Render a sequence of spans (with inline math support)."""
-        for segment in self._expand_inline_spans(spans):
+        for segment in self._iter_expanded_spans(spans):
             x = self._render_rich_text_span(segment, x, y, base_size, use_black)
         return x
     
@@ -572,7 +904,7 @@ class PDFRenderer:
                     if getattr(span, "math", False):
                         total_text_width += self._measure_math_width(span.text, font_sizes.caption)
                     else:
-                        total_text_width += self.c.stringWidth(span.text, self._get_font_name(span), font_sizes.caption)
+                        total_text_width += self._text_width(span.text, self._get_font_name(span), font_sizes.caption)
                 extra_space = (self.content_width - total_text_width) / max(len(line_spans) - 1, 1)
             else:
                 # Left align for single-line or last line
@@ -581,7 +913,7 @@ class PDFRenderer:
             x_offset = self.x
             for span_idx, span in enumerate(line_spans):
                 # Use muted color for captions
-                self.c.setFillColorRGB(*colors.text_muted)
+                self._set_fill_color(colors.text_muted)
                 x_offset = self._render_rich_text_span(span, x_offset, self.y, font_sizes.caption)
                 # Add extra space between words for justification
                 if extra_space > 0 and span_idx < len(line_spans) - 1:
@@ -591,7 +923,7 @@ class PDFRenderer:
         
         self.y -= spacing.caption_gap - 4
         
-        self.c.setFillColorRGB(*colors.text_primary)
+        self._set_fill_color(colors.text_primary)
     
     def _render_rich_text_span(self, span: RichText, x: float, y: float, 
                                 base_size: float, use_black: bool = False) -> float:
@@ -615,30 +947,17 @@ class PDFRenderer:
             return self._render_inline_math_span(span, x, y, base_size, use_black)
 
         font_name = self._get_font_name(span)
-        self.c.setFont(font_name, base_size)
-        text_width = self.c.stringWidth(span.text, font_name, base_size)
+        self._set_font(font_name, base_size)
+        text_width = self._text_width(span.text, font_name, base_size)
 
         if text_width == 0:
             return x
 
         if span.highlight and span.highlight in HIGHLIGHT_COLORS:
-            highlight_color = HIGHLIGHT_COLORS[span.highlight]
-            padding = 1
-            self.c.saveState()
-            self.c.setFillColorRGB(highlight_color[0], highlight_color[1], highlight_color[2], alpha=0.35)
-            self.c.roundRect(
-                x - padding,
-                y - base_size - padding,
-                text_width + padding * 2,
-                base_size + padding * 2,
-                2,
-                fill=1,
-                stroke=0
-            )
-            self.c.restoreState()
+            self._draw_highlight(HIGHLIGHT_COLORS[span.highlight], x, y - base_size, text_width, base_size)
 
         color_rgb = self._resolve_span_color(span, use_black)
-        self.c.setFillColorRGB(*color_rgb)
+        self._set_fill_color(color_rgb)
         self.c.drawString(x, y - base_size, span.text)
 
         return x + text_width
@@ -648,59 +967,60 @@ class PDFRenderer:
         """Wrap rich text spans across multiple lines (with inline math)."""
         lines: ListType[ListType[RichText]] = []
         current_line: ListType[RichText] = []
+        current_sources: ListType[int] = []
         current_width = 0.0
 
-        for span in self._expand_inline_spans(spans):
-            if span.text == "":
+        for span_index, span in enumerate(self._iter_expanded_spans(spans)):
+            text = span.text
+            if not text:
                 continue
 
-            if getattr(span, "math", False):
-                tokens = [span]
+            # Measure each word/space run straight from the span text; a
+            # derived span is only built for runs that land on a line
+            if span.math:
+                parts = (text,)
+                font_name = None
             else:
-                parts = re.split(r'(\s+)', span.text)
-                tokens = [span.model_copy(update={"text": part}) for part in parts if part]
+                parts = WHITESPACE_SPLIT_PATTERN.split(text)
+                font_name = self._get_font_name(span)
 
-            for token in tokens:
-                token_text = token.text
-                if token_text == "":
+            for part in parts:
+                if not part:
                     continue
 
-                is_math = getattr(token, "math", False)
-                is_space = token_text.isspace()
-
-                if is_math:
-                    token_width = self._measure_math_width(token.text, font_size)
+                if font_name is None:
+                    part_width = self._measure_math_width(part, font_size)
                 else:
-                    font_name = self._get_font_name(token)
-                    token_width = self.c.stringWidth(token_text, font_name, font_size)
+                    part_width = self._text_width(part, font_name, font_size)
 
-                if token_width == 0:
+                if part_width == 0:
                     continue
 
-                if current_width + token_width > max_width and current_line and not (is_space and len(current_line) == 0):
+                is_space = part.isspace()
+                if current_width + part_width > max_width and current_line:
                     lines.append(current_line)
                     current_line = []
+                    current_sources = []
                     current_width = 0.0
 
-                    if is_space:
-                        continue
-
-                    if not is_math and token_text.startswith(' '):
-                        trimmed = token_text.lstrip()
-                        if not trimmed:
-                            continue
-                        token = token.model_copy(update={"text": trimmed})
-                        font_name = self._get_font_name(token)
-                        token_width = self.c.stringWidth(token.text, font_name, font_size)
-
                 if is_space and not current_line:
                     continue
 
-                current_line.append(token)
-                current_width += token_width
+                current_line.append(span if part == text else span.model_copy(update={"text": part}))
+                current_sources.append(span_index)
+                current_width += part_width
 
         if current_line:
-            lines.append(current_line)
+            # The last line is never justified, so consecutive words from the
+            # same span can be drawn as a single string
+            last_line: ListType[RichText] = []
+            for _, run in itertools.groupby(zip(current_line, current_sources), key=operator.itemgetter(1)):
+                run_spans = [part for part, _ in run]
+                if len(run_spans) == 1:
+                    last_line.append(run_spans[0])
+                else:
+                    last_line.append(run_spans[0].model_copy(update={"text": "".join(part.text for part in run_spans)}))
+            lines.append(last_line)
 
         return lines if lines else [[RichText(text="")]]
     
@@ -742,14 +1062,14 @@ class PDFRenderer:
             box_y = self.y - font_sizes.body + 2
             
             # Draw checkbox outline (lighter color)
-            self.c.setStrokeColorRGB(*colors.line_light)
-            self.c.setLineWidth(1)
+            self._set_stroke_color(colors.line_light)
+            self._set_line_width(1)
             self.c.roundRect(indent, box_y, box_size, box_size, 2, stroke=1, fill=0)
             
             # If checked, draw checkmark
             if item.checked:
-                self.c.setStrokeColorRGB(*colors.brand_brown)
-                self.c.setLineWidth(1.5)
+                self._set_stroke_color(colors.brand_brown)
+                self._set_line_width(1.5)
                 # Draw checkmark
                 self.c.line(indent + 2, box_y + 5, indent + 4, box_y + 2)
                 self.c.line(indent + 4, box_y + 2, indent + 8, box_y + 8)
@@ -761,8 +1081,8 @@ class PDFRenderer:
         
         # Draw text marker if present
         if marker:
-            self.c.setFont(self.custom_fonts.body, font_sizes.body)
-            self.c.setFillColorRGB(*marker_color)
+            self._set_font(self.custom_fonts.body, font_sizes.body)
+            self._set_fill_color(marker_color)
             self.c.drawString(indent, self.y - font_sizes.body, marker)
         
         # Render item text with wrapping and justification
@@ -780,7 +1100,7 @@ class PDFRenderer:
                         if getattr(span, "math", False):
                             total_text_width += self._measure_math_width(span.text, font_sizes.body)
                         else:
-                            total_text_width += self.c.stringWidth(span.text, self._get_font_name(span), font_sizes.body)
+                            total_text_width += self._text_width(span.text, self._get_font_name(span), font_sizes.body)
                     extra_space = (available_width - total_text_width) / max(len(line_spans) - 1, 1)
                 else:
                     # Left align for single-line or last line
@@ -811,7 +1131,7 @@ class PDFRenderer:
         center_x = self.x + self.content_width / 2
         
         # Always use delicate dots pattern (rounded style)
-        self.c.setFillColorRGB(*colors.line_light)
+        self._set_fill_color(colors.line_light)
         
         # Three small circles
         for i in range(3):
@@ -822,7 +1142,7 @@ class PDFRenderer:
     
     def _render_page_break(self):
         """Force a new page."""
-        self.c.showPage()
+        self._show_page()
         self.y = self.page_height - self.margin_top
     
     def _render_code(self, code_block: Code):
@@ -836,20 +1156,23 @@ class PDFRenderer:
         self.y -= spacing.section_gap
         
         # Background with rounded corners
-        self.c.setFillColorRGB(*colors.code_bg)
-        self.c.setStrokeColorRGB(*colors.code_border)
-        self.c.setLineWidth(0.5)
+        self._set_fill_color(colors.code_bg)
+        self._set_stroke_color(colors.code_border)
+        self._set_line_width(0.5)
         self.c.roundRect(self.x, self.y - block_height, self.content_width, block_height,
                         6, fill=1, stroke=1)  # 6pt corner radius
         
         # Code text
-        self.c.setFillColorRGB(*colors.text_primary)
-        self.c.setFont(self.custom_fonts.code, font_sizes.code)
+        self._set_fill_color(colors.text_primary)
+        self._set_font(self.custom_fonts.code, font_sizes.code)
         
-        text_y = self.y - spacing.code_padding - font_sizes.code
+        # One text object for the whole block: a single BT/ET with T* line advances
+        text = self.c.beginText(self.x + spacing.code_padding,
+                                self.y - spacing.code_padding - font_sizes.code)
+        text.setLeading(line_height)
         for line in lines:
-            self.c.drawString(self.x + spacing.code_padding, text_y, line)
-            text_y -= line_height
+            text.textLine(line)
+        self.c.drawText(text)
         
         self.y -= block_height + spacing.section_gap
     
@@ -860,19 +1183,17 @@ class PDFRenderer:
             return
 
         font_size = font_sizes.body * 1.1
-        _, height_pt, _ = self._get_math_metrics(latex, font_size)
+        path, width_pt, height_pt, depth_pt = self._get_math_path(latex, font_size)
         required_height = height_pt + spacing.section_gap * 2
         self._check_page_break(required_height)
 
         self.y -= spacing.section_gap
 
         color_rgb = colors.text_primary
-        img_bytes, width_pt, height_pt, _ = self._get_math_image(latex, font_size, color_rgb)
-
-        if not img_bytes or width_pt == 0:
+        if path is None or width_pt == 0:
             # Fallback: render plain text
-            self.c.setFont(self.custom_fonts.body, font_sizes.body)
-            self.c.setFillColorRGB(*color_rgb)
+            self._set_font(self.custom_fonts.body, font_sizes.body)
+            self._set_fill_color(color_rgb)
             self.c.drawString(self.x, self.y - font_sizes.body, latex)
             self.y -= font_sizes.body + spacing.section_gap
             return
@@ -880,15 +1201,7 @@ class PDFRenderer:
         x_centered = self.x + (self.content_width - width_pt) / 2
         y_bottom = self.y - height_pt
 
-        image_reader = ImageReader(io.BytesIO(img_bytes))
-        self.c.drawImage(
-            image_reader,
-            x_centered,
-            y_bottom,
-            width=width_pt,
-            height=height_pt,
-            mask='auto'
-        )
+        self._draw_math_path(latex, font_size, x_centered, y_bottom + depth_pt, color_rgb)
 
         self.y = y_bottom - spacing.section_gap
     
@@ -896,21 +1209,23 @@ class PDFRenderer:
         """Render a table with improved styling and dynamic row heights."""
         # Calculate column widths
         if table.widths:
-            total_ratio = sum(table.widths)
-            col_widths = [(w / total_ratio) * self.content_width for w in table.widths]
+            scale = self.content_width / sum(table.widths)
+            col_widths = [w * scale for w in table.widths]
         else:
-            col_width = self.content_width / table.columns
-            col_widths = [col_width] * table.columns
+            col_widths = [self.content_width / table.columns] * table.columns
+        cell_widths = [w - 2 * spacing.table_cell_padding for w in col_widths]
+        
+        # Wrap every cell once; the lines are reused when drawing
+        row_lines = [
+            [self._wrap_rich_text(cell, cell_widths[col_idx], font_sizes.body) if cell else None
+             for col_idx, cell in enumerate(row.cells)]
+            for row in table.rows
+        ]
         
         # Calculate row heights dynamically based on content
         row_heights = []
-        for row in table.rows:
-            max_lines = 1
-            for col_idx, cell in enumerate(row.cells):
-                if cell:
-                    cell_width = col_widths[col_idx] - 2 * spacing.table_cell_padding
-                    lines = self._wrap_rich_text(cell, cell_width, font_sizes.body)
-                    max_lines = max(max_lines, len(lines))
+        for cells_lines in row_lines:
+            max_lines = max([len(lines) for lines in cells_lines if lines], default=1)
             # Row height = number of lines * (font size + line spacing) + padding
             row_height = max_lines * (font_sizes.body + 2) + spacing.table_cell_padding * 2
             row_heights.append(row_height)
@@ -923,40 +1238,44 @@ class PDFRenderer:
         
         # Draw table with outer rounded rectangle
         start_y = self.y
-        current_y = self.y
+        
+        # Column left edges and row top edges (one extra entry closes the table)
+        col_x = list(itertools.accumulate(col_widths, initial=self.x))
+        row_y = list(itertools.accumulate(row_heights, operator.sub, initial=start_y))
         
         # Draw outer border with rounded corners
-        self.c.setStrokeColorRGB(*colors.line_light)
-        self.c.setLineWidth(1.0)
-        self.c.roundRect(self.x, current_y - table_height, self.content_width, table_height,
+        self._set_stroke_color(colors.line_light)
+        self._set_line_width(1.0)
+        self.c.roundRect(self.x, start_y - table_height, self.content_width, table_height,
                         4, fill=0, stroke=1)
         
-        # Draw rows
-        for row_idx, row in enumerate(table.rows):
-            current_x = self.x
-            row_height = row_heights[row_idx]
-            
-            # Header row background (first row)
-            if row_idx == 0:
-                self.c.setFillColorRGB(0.97, 0.97, 0.97)  # Very light gray
-                self.c.rect(self.x, current_y - row_height, self.content_width, row_height,
-                           fill=1, stroke=0)
+        # Header row background (first row)
+        if row_lines:
+            self._set_fill_color((0.97, 0.97, 0.97))  # Very light gray
+            self.c.rect(self.x, row_y[1], self.content_width, row_heights[0],
+                       fill=1, stroke=0)
+        
+        # Draw rows (grid separators are collected and stroked after the text)
+        separators = []
+        last_row = len(row_lines) - 1
+        for row_idx, cells_lines in enumerate(row_lines):
+            row_top = row_y[row_idx]
+            row_bottom = row_y[row_idx + 1]
             
             # Draw cells
-            for col_idx, cell in enumerate(row.cells):
-                # Draw vertical separators (except first and last)
+            for col_idx, lines in enumerate(cells_lines):
+                cell_x = col_x[col_idx]
+                
+                # Vertical separators (except first and last)
                 if col_idx > 0:
-                    self.c.setStrokeColorRGB(*colors.line_light)
-                    self.c.setLineWidth(0.5)
-                    self.c.line(current_x, current_y, current_x, current_y - row_height)
+                    separators.append((cell_x, row_top, cell_x, row_bottom))
                 
                 # Cell text with rich text support, wrapping and justification
-                if cell:
-                    cell_width = col_widths[col_idx] - 2 * spacing.table_cell_padding
-                    lines = self._wrap_rich_text(cell, cell_width, font_sizes.body)
+                if lines:
+                    cell_width = cell_widths[col_idx]
                     
                     # Render each line with justification
-                    text_y = current_y - spacing.table_cell_padding - font_sizes.body
+                    text_y = row_top - spacing.table_cell_padding - font_sizes.body
                     for line_idx, line_spans in enumerate(lines):
                         is_last_line = (line_idx == len(lines) - 1)
                         
@@ -968,13 +1287,13 @@ class PDFRenderer:
                                 if getattr(span, "math", False):
                                     total_text_width += self._measure_math_width(span.text, font_sizes.body)
                                 else:
-                                    total_text_width += self.c.stringWidth(span.text, self._get_font_name(span), font_sizes.body)
+                                    total_text_width += self._text_width(span.text, self._get_font_name(span), font_sizes.body)
                             extra_space = (cell_width - total_text_width) / max(len(line_spans) - 1, 1)
                         else:
                             # Left align for single-line or last line
                             extra_space = 0
                         
-                        x_offset = current_x + spacing.table_cell_padding
+                        x_offset = cell_x + spacing.table_cell_padding
                         for span_idx, span in enumerate(line_spans):
                             x_offset = self._render_rich_text_span(span, x_offset, text_y + font_sizes.body, font_sizes.body)
                             # Add extra space between words for justification
@@ -982,29 +1301,85 @@ class PDFRenderer:
                                 x_offset += extra_space
                         
                         text_y -= font_sizes.body + 2
-                
-                current_x += col_widths[col_idx]
             
-            # Draw horizontal separator (except last row)
-            if row_idx < len(table.rows) - 1:
-                self.c.setStrokeColorRGB(*colors.line_light)
-                self.c.setLineWidth(0.5)
-                self.c.line(self.x, current_y - row_height, self.x + self.content_width, current_y - row_height)
+            # Horizontal separator (except last row)
+            if row_idx < last_row:
+                separators.append((self.x, row_bottom, self.x + self.content_width, row_bottom))
+        
+        # Stroke the whole inner grid at once
+        if separators:
+            self._set_stroke_color(colors.line_light)
+            self._set_line_width(0.5)
+            self.c.lines(separators)
+        
+        self.y = row_y[-1] - spacing.section_gap
+    
+    def _load_image(self, src: str) -> ImageReader:
+        """
+        Open an image source, decoding each distinct src once per document.
+        
+        Args:
+            src: File path or http(s) URL (remote ones are prefetched)
             
-            current_y -= row_height
+        Returns:
+            ImageReader shared by every occurrence of src
+        """
+        img = self._image_readers.get(src)
+        if img is None:
+            if src.startswith(('http://', 'https://')):
+                fetch = self._image_fetches.get(src)
+                if fetch is None:
+                    fetch = self._image_fetches[src] = _image_fetch_pool.submit(_fetch_image, src)
+                img = ImageReader(io.BytesIO(fetch.result()))
+            else:
+                img = ImageReader(src)
+            self._image_readers[src] = img
+        return img
+    
+    def _downsample_image(self, src: str, img: ImageReader, display_width: float,
+                          display_height: float) -> ImageReader:
+        """
+        Shrink an image that has more pixels than IMAGE_EMBED_DPI needs.
         
-        self.y = current_y - spacing.section_gap
+        Args:
+            src: Image source (part of the cache key)
+            img: Decoded full-size image
+            display_width: Placed width in points
+            display_height: Placed height in points
+            
+        Returns:
+            The original reader, or a reader over a downsampled copy
+        """
+        target = (math.ceil(display_width * IMAGE_EMBED_DPI / 72),
+                  math.ceil(display_height * IMAGE_EMBED_DPI / 72))
+        img_width, img_height = img.getSize()
+        if img_width <= target[0] and img_height <= target[1]:
+            return img
+        
+        key = (src, target)
+        scaled = self._scaled_images.get(key)
+        if scaled is None:
+            pil_image = img._image
+            if pil_image.mode not in ("RGB", "RGBA", "L", "LA"):
+                pil_image = pil_image.convert("RGBA" if "transparency" in pil_image.info else "RGB")
+            else:
+                pil_image = pil_image.copy()
+            pil_image.thumbnail(target, PILImage.LANCZOS)
+            if img._image.format == "JPEG" and pil_image.mode in ("RGB", "L"):
+                # Re-encode photos as JPEG so they stay DCT-compressed in the PDF
+                encoded = io.BytesIO()
+                pil_image.save(encoded, "JPEG", quality=90)
+                encoded.seek(0)
+                scaled = ImageReader(encoded)
+            else:
+                scaled = ImageReader(pil_image)
+            self._scaled_images[key] = scaled
+        return scaled
     
     def _render_image(self, image: Image):
         """Render an embedded image."""
         try:
-            # Download or open image
-            if image.src.startswith(('http://', 'https://')):
-                with urllib.request.urlopen(image.src) as response:
-                    img_data = response.read()
-                    img = ImageReader(io.BytesIO(img_data))
-            else:
-                img = ImageReader(image.src)
+            img = self._load_image(image.src)
             
             # Get image dimensions
             img_width, img_height = img.getSize()
@@ -1020,9 +1395,11 @@ class PDFRenderer:
                 display_height = page_config.mm_to_points(image.height_mm)
                 display_width = display_height * (img_width / img_height)
             else:
-                # Default: fit to content width
-                display_width = min(self.content_width, img_width)
-                display_height = display_width * (img_height / img_width)
+                # Default: natural physical size (from the file's DPI when it
+                # records one), shrunk to fit the content width
+                dpi = img._image.info.get("dpi", (IMAGE_DEFAULT_DPI,))[0] or IMAGE_DEFAULT_DPI
+                display_width = min(self.content_width, img_width * 72.0 / dpi)
+                display_height = display_width * img_height / img_width
             
             self._check_page_break(display_height + spacing.section_gap)
             
@@ -1031,6 +1408,7 @@ class PDFRenderer:
             # Center image
             x_centered = self.x + (self.content_width - display_width) / 2
             
+            img = self._downsample_image(image.src, img, display_width, display_height)
             self.c.drawImage(img, x_centered, self.y - display_height,
                            width=display_width, height=display_height,
                            preserveAspectRatio=True, mask='auto')
@@ -1039,8 +1417,10 @@ class PDFRenderer:
         
         except Exception as e:
             # Fallback: render error message
-            self.c.setFont(self.custom_fonts.italic, font_sizes.caption)
-            self.c.setFillColorRGB(*colors.text_muted)
+            self.used_fallback = True
+            self._ensure_custom_font()
+            self._set_font(self.custom_fonts.italic, font_sizes.caption)
+            self._set_fill_color(colors.text_muted)
             self.c.drawString(self.x, self.y - font_sizes.caption, 
                             f"[Image error: {str(e)}]")
             self.y -= font_sizes.caption + spacing.paragraph_gap
@@ -1053,59 +1433,106 @@ class PDFRenderer:
         
         self.y -= spacing.section_gap
         
+        # Blank area without an outline only reserves space
+        if exercise.variant == "blank" and not exercise.border:
+            self.y -= height + spacing.section_gap
+            return
+        
         # Draw rounded rectangle border
-        self.c.setStrokeColorRGB(*colors.line_light)
-        self.c.setLineWidth(0.5)
-        self.c.roundRect(self.x, self.y - height, self.content_width, height,
-                        EXERCISE_AREA["corner_radius"], stroke=1, fill=0)
+        if exercise.border:
+            self._set_stroke_color(colors.line_light)
+            self._set_line_width(0.5)
+            if EXERCISE_AREA["corner_radius"]:
+                self.c.roundRect(self.x, self.y - height, self.content_width, height,
+                                EXERCISE_AREA["corner_radius"], stroke=1, fill=0)
+            else:
+                self.c.rect(self.x, self.y - height, self.content_width, height, stroke=1, fill=0)
+        
+        # Draw pattern (blank: no pattern needed)
+        if exercise.variant != "blank":
+            key = (exercise.variant, self.content_width, height)
+            form_name = self._pattern_forms.get(key)
+            if form_name is None:
+                form_name = f"exercise{len(self._pattern_forms)}"
+                self.c.beginForm(form_name, 0, 0, self.content_width, height)
+                self._draw_exercise_pattern(exercise.variant, self.content_width, height)
+                self.c.endForm()
+                self._pattern_forms[key] = form_name
+            
+            self.c.saveState()
+            self.c.translate(self.x, self.y - height)
+            self.c.doForm(form_name)
+            self.c.restoreState()
+        
+        self.y -= height + spacing.section_gap
+    
+    def _draw_exercise_pattern(self, variant: str, width: float, height: float):
+        """
+        Draw an exercise-area pattern with its bottom-left corner at the origin.
         
-        # Draw pattern
-        if exercise.variant == "ruled":
+        Called once per (variant, width, height) while a form XObject is open;
+        every matching area on any page then references that form.
+        """
+        if variant == "ruled":
             # Horizontal lines
             self.c.setStrokeColorRGB(*colors.line_light)
             self.c.setLineWidth(0.3)
             
-            y_pos = self.y - EXERCISE_AREA["ruled_spacing"]
-            while y_pos > self.y - height:
-                self.c.line(self.x + 5, y_pos, self.x + self.content_width - 5, y_pos)
-                y_pos -= EXERCISE_AREA["ruled_spacing"]
-        
-        elif exercise.variant == "dotgrid":
-            # Dot grid
-            self.c.setFillColorRGB(*colors.line_light)
+            spacing_val = EXERCISE_AREA["ruled_spacing"]
+            x_right = width - 5
+            rules = []
+            y_pos = height - spacing_val
+            while y_pos > 0:
+                rules.append((5, y_pos, x_right, y_pos))
+                y_pos -= spacing_val
+            self.c.lines(rules)
+        
+        elif variant == "dotgrid":
+            # Dot grid: each dot is a zero-length round-capped stroke, so the
+            # whole grid is one path of move/line pairs instead of Bezier circles
+            self.c.setStrokeColorRGB(*colors.line_light)
+            self.c.setLineWidth(EXERCISE_AREA["dot_radius"] * 2)
+            self.c.setLineCap(1)
             
             spacing_val = EXERCISE_AREA["dotgrid_spacing"]
-            x_pos = self.x + spacing_val
-            while x_pos < self.x + self.content_width:
-                y_pos = self.y - spacing_val
-                while y_pos > self.y - height:
-                    self.c.circle(x_pos, y_pos, EXERCISE_AREA["dot_radius"], 
-                                 stroke=0, fill=1)
-                    y_pos -= spacing_val
+            
+            # Row positions are shared by every column of dots
+            rows = []
+            y_pos = height - spacing_val
+            while y_pos > 0:
+                rows.append(y_pos)
+                y_pos -= spacing_val
+            
+            dots = self.c.beginPath()
+            move_to, line_to = dots.moveTo, dots.lineTo
+            x_pos = spacing_val
+            while x_pos < width:
+                for y_pos in rows:
+                    move_to(x_pos, y_pos)
+                    line_to(x_pos, y_pos)
                 x_pos += spacing_val
+            self.c.drawPath(dots, stroke=1, fill=0)
         
-        elif exercise.variant == "square":
+        elif variant == "square":
             # Square grid
             self.c.setStrokeColorRGB(*colors.line_light)
             self.c.setLineWidth(0.3)
             
             spacing_val = EXERCISE_AREA["square_spacing"]
+            grid = []
             
             # Vertical lines
-            x_pos = self.x + spacing_val
-            while x_pos < self.x + self.content_width:
-                self.c.line(x_pos, self.y, x_pos, self.y - height)
+            x_pos = spacing_val
+            while x_pos < width:
+                grid.append((x_pos, height, x_pos, 0))
                 x_pos += spacing_val
             
             # Horizontal lines
-            y_pos = self.y - spacing_val
-            while y_pos > self.y - height:
-                self.c.line(self.x, y_pos, self.x + self.content_width, y_pos)
+            y_pos = height - spacing_val
+            while y_pos > 0:
+                grid.append((0, y_pos, width, y_pos))
                 y_pos -= spacing_val
-        
-        # blank: no pattern needed
-        
-        self.y -= height + spacing.section_gap
+            self.c.lines(grid)
     
     def _render_card(self, card: Card):
         """
@@ -1140,7 +1567,7 @@ class PDFRenderer:
         # Check if we need to move to a new page
         if start_y - total_card_height < self.margin_bottom:
             # Card doesn't fit on current page, move to new page
-            self.c.showPage()
+            self._show_page()
             self.y = self.page_height - self.margin_top
             start_y = self.y
             
@@ -1211,3 +1638,41 @@ def render_document(document: Document) -> bytes:
     """
     renderer = PDFRenderer(document)
     return renderer.render()
+
+
+def render_document_with_status(document: Document) -> Tuple[bytes, bool]:
+    """
+    Render a document to PDF bytes and report whether a fallback was used.
+    
+    Args:
+        document: Document model
+        
+    Returns:
+        Tuple of (PDF bytes, whether a font or image fell back to a placeholder
+        because it could not be loaded)
+    """
+    renderer = PDFRenderer(document)
+    pdf_bytes = renderer.render()
+    return pdf_bytes, renderer.used_fallback
+
+
+def warmup() -> None:
+    """
+    Render a small throwaway document to initialize the rendering stack.
+    
+    Exercises ReportLab font metrics and matplotlib's mathtext parser so the
+    first real request does not pay their one-off initialization cost.
+    """
+    document = Document(
+        meta=Meta(title="Warmup"),
+        blocks=[
+            Heading(level=1, text=[RichText(text="Warmup")]),
+            Paragraph(text=[
+                RichText(text="Body "),
+                RichText(text="bold ", bold=True),
+                RichText(text="x^2", math=True),
+            ]),
+            Formula(latex=r"\frac{a}{b}"),
+        ],
+    )
+    render_document(document)
@@ -0,0 +1,76 @@
+"""
+Tests for the single-pass JSON repair scanner and AutoRepair.repair_json.
+
+License: MIT
+"""
+
+import json
+
+import pytest
+
+from app.auto_repair import AutoRepair, _scan_and_repair
+
+
+@pytest.mark.parametrize("raw, expected, note", [
+    ('{"a": 1, // note\n"b": 2}', {"a": 1, "b": 2}, "Removed comments"),
+    ('{"a": /* inline */ 1}', {"a": 1}, "Removed comments"),
+    ('{"a": [1, 2,], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}, "Removed trailing commas"),
+    ("{'a': 1, 'it\\'s': 2}", {"a": 1, "it's": 2}, "Converted single-quoted keys"),
+    ("{'say \"hi\"': 1}", {'say "hi"': 1}, "Converted single-quoted keys"),
+    ('{a: 1, $b_2 : 2}', {"a": 1, "$b_2": 2}, "Quoted unquoted keys"),
+    ('{"a": "line\nbreak\ttab"}', {"a": "line\nbreak\ttab"}, "Escaped newlines in strings"),
+])
+def test_scanner_repairs(raw, expected, note):
+    repaired, notes = _scan_and_repair(raw)
+    assert json.loads(repaired) == expected
+    assert notes == [note]
+
+
+@pytest.mark.parametrize("raw", [
+    '{"url": "http://example.com/a//b"}',
+    '{"text": "/* not a comment */"}',
+    '{"text": "a, ]", "list": ["x,}"]}',
+    '{"text": "it\'s: fine", "other": "\'quoted\': 1"}',
+    '{"text": "key: value, more: stuff"}',
+    '{"text": "escaped \\" // quote, }"}',
+    '{"a": true, "b": null, "c": [false]}',
+])
+def test_scanner_leaves_valid_json_untouched(raw):
+    assert _scan_and_repair(raw) == (raw, [])
+
+
+def test_scanner_combines_repairs():
+    raw = "{\n  // comment\n  title: \"x\",\n  'tags': [\"a, //b\",],\n}"
+    repaired, notes = _scan_and_repair(raw)
+    assert json.loads(repaired) == {"title": "x", "tags": ["a, //b"]}
+    assert notes == [
+        "Converted single-quoted keys",
+        "Quoted unquoted keys",
+        "Removed comments",
+        "Removed trailing commas",
+    ]
+
+
+@pytest.mark.parametrize("raw, expected, note", [
+    ('\ufeff{"a": "x\ufeffy"}', {"a": "x\ufeffy"}, "Removed BOM"),
+    ('{"a": "x\x01"}', {"a": "x"}, "Removed control characters"),
+    ('{"a": {"b": 2', {"a": {"b": 2}}, "Added 2 closing brace(s)"),
+    ('{"a": 1} trailing', {"a": 1}, "Removed trailing content"),
+    ('{\n  "a": 1\n  "b": "x"\n  "c": true\n  "d": 2\n}', {"a": 1, "b": "x", "c": True, "d": 2}, "Added missing commas"),
+])
+def test_repair_json(raw, expected, note):
+    success, _, parsed, repairs, error = AutoRepair.repair_json(raw)
+    assert success, error
+    assert parsed == expected
+    assert note in repairs
+
+
+def test_repair_json_reports_no_repairs_for_valid_json():
+    assert AutoRepair.repair_json('{"a": 1}') == (True, '{"a": 1}', {"a": 1}, [], None)
+
+
+def test_parse_bytes_accepts_non_finite_numbers():
+    success, data, repairs, error = AutoRepair.parse_bytes(b'{"a": NaN, "b": -Infinity}')
+    assert success, error
+    assert data["a"] != data["a"] and data["b"] == float("-inf")
+    assert repairs == []